@@ -0,0 +1,231 @@
+# Headless batch solver.
+#
+# Reads puzzles from a file or stdin, one 81-character line each ("0" or "."
+# for empty cells, 256 or 625 characters for 16x16 and 25x25), solves them in chunks on a multiprocessing pool and streams
+# one result line per puzzle to stdout. Only a bounded number of chunks is in
+# flight at any time, so memory stays flat however long the input is.
+#
+# Usage:
+#   python batch.py puzzles.txt > solutions.txt
+#   cat puzzles.txt | python batch.py --jobs 8 --unordered
+#   python batch.py puzzles.txt --stats stats.jsonl > solutions.txt
+#   python batch.py puzzles.sdk > solutions.txt      # packed file, see packed.py
+#   python batch.py puzzles.txt --verify > solutions.txt
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import queue
+import sys
+from collections import deque
+
+from core import parse_puzzle, format_puzzle
+from solver import SolveStats, solve as engine_solve
+from solvers import DEFAULT, SOLVERS, get_solver
+
+# Results written for puzzles that could not be solved
+INVALID = "invalid"
+UNSOLVABLE = "unsolvable"
+# Start of the result written for solutions that fail --verify, followed by the broken units
+FAILED = "failed"
+
+
+# Function to solve one puzzle line and return its result line
+def solve_line(line, solve):
+    board = parse_puzzle(line)
+    if board is None:
+        return INVALID
+    if not solve(board):
+        return UNSOLVABLE
+    return format_puzzle(board)
+
+
+# Function to solve one puzzle line with the engine while collecting search
+# statistics. Returns the result line and the statistics as a dict (None for
+# an invalid line).
+def solve_line_stats(line):
+    board = parse_puzzle(line)
+    if board is None:
+        return INVALID, None
+    stats = SolveStats()
+    if not engine_solve(board, stats):
+        return UNSOLVABLE, stats.as_dict()
+    return format_puzzle(board), stats.as_dict()
+
+
+# Worker function: solves a chunk of (line number, line) pairs, or a Span of a
+# packed file, which the worker reads from the file itself. Returns
+# (line number, result, statistics) triples, the statistics are only collected
+# with stats=True and need the engine backend. With verify=True every
+# solution is checked against its puzzle before it is returned.
+def solve_chunk(chunk, solver=DEFAULT, vectorized=False, stats=False, verify=False):
+    if not isinstance(chunk, list):
+        chunk = chunk.lines()
+    if vectorized:
+        results = solve_chunk_vectorized(chunk, solver)
+    elif stats:
+        results = [(number,) + solve_line_stats(line) for number, line in chunk]
+    else:
+        solve = get_solver(solver)
+        results = [(number, solve_line(line, solve), None) for number, line in chunk]
+    if verify:
+        verify_results(chunk, results)
+    return results
+
+
+# Function to check the solutions of a chunk with the NumPy bulk verifier,
+# one stack per board size. Results whose solution breaks a rule or changes a
+# given are replaced, in place, by a FAILED result naming what is wrong.
+def verify_results(chunk, results):
+    import numpy as np
+    from vectorized import verify_batch, describe_failure
+
+    by_size = {}
+    for k, (_, result, _) in enumerate(results):
+        if result not in (INVALID, UNSOLVABLE):
+            by_size.setdefault(len(result), []).append(k)
+    for ks in by_size.values():
+        puzzles = np.array([parse_puzzle(chunk[k][1]) for k in ks], dtype=np.uint8)
+        solutions = np.array([parse_puzzle(results[k][1]) for k in ks], dtype=np.uint8)
+        ok, units, changed = verify_batch(solutions, puzzles)
+        for j in np.flatnonzero(~ok):
+            number, _, stats = results[ks[j]]
+            results[ks[j]] = (number, FAILED + ": " + ", ".join(describe_failure(units[j], changed[j])), stats)
+
+
+# Worker function: solves a chunk with the NumPy batch engine, the scalar
+# `solver` backend only sees the puzzles that propagation alone can't finish.
+# The batch engine handles 9x9 boards, larger ones go straight to the backend.
+def solve_chunk_vectorized(chunk, solver=DEFAULT):
+    import numpy as np
+    from vectorized import solve_batch
+
+    boards = [parse_puzzle(line) for _, line in chunk]
+    valid = [i for i, board in enumerate(boards) if board is not None and len(board) == 9]
+    results = [INVALID] * len(chunk)
+    solve = get_solver(solver)
+    for i, board in enumerate(boards):
+        if board is not None and len(board) != 9:
+            results[i] = format_puzzle(board) if solve(board) else UNSOLVABLE
+    if valid:
+        solved, ok = solve_batch(np.array([boards[i] for i in valid], dtype=np.uint8), solver)
+        for k, i in enumerate(valid):
+            results[i] = format_puzzle(solved[k]) if ok[k] else UNSOLVABLE
+    return [(number, result, None) for (number, _), result in zip(chunk, results)]
+
+
+# Function to check if a file is a packed puzzle file (without importing NumPy)
+def is_packed(path):
+    with open(path, "rb") as f:
+        return f.read(4) == b"SDKP"
+
+
+# Function to read non-empty puzzle lines and group them into chunks
+def read_chunks(stream, chunk_size):
+    lines = ((number, line) for number, line in enumerate(stream, 1) if line.strip())
+    while True:
+        chunk = list(itertools.islice(lines, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Generator that solves chunks on the pool and yields (line number, result,
+# statistics) triples. At most `window` chunks are queued at once; with
+# ordered=False results are yielded as soon as a chunk finishes instead of in
+# input order.
+def solve_stream(pool, chunks, solver=DEFAULT, window=16, ordered=True, vectorized=False, stats=False,
+                 verify=False):
+    args = (solver, vectorized, stats, verify)
+    if ordered:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.apply_async(solve_chunk, (chunk,) + args))
+            if len(pending) >= window:
+                yield from pending.popleft().get()
+        while pending:
+            yield from pending.popleft().get()
+        return
+
+    done = queue.Queue()
+    in_flight = 0
+    for chunk in chunks:
+        pool.apply_async(solve_chunk, (chunk,) + args, callback=done.put, error_callback=done.put)
+        in_flight += 1
+        while in_flight >= window:
+            yield from _finished(done.get())
+            in_flight -= 1
+    while in_flight:
+        yield from _finished(done.get())
+        in_flight -= 1
+
+
+# Function to re-raise a worker error collected by solve_stream
+def _finished(result):
+    if isinstance(result, BaseException):
+        raise result
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve Sudoku puzzles in bulk, one puzzle line (81, 256 or 625 characters) per puzzle.")
+    parser.add_argument("input", nargs="?", default="-",
+                        help="puzzle file, text or packed (see packed.py), '-' for stdin (default)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("-c", "--chunk-size", type=int, default=256, help="puzzles sent to a worker at once")
+    parser.add_argument("-s", "--solver", default=DEFAULT, choices=sorted(SOLVERS), help="solver backend")
+    parser.add_argument("-u", "--unordered", action="store_true",
+                        help="write results as soon as they are ready, prefixed with the input line number")
+    parser.add_argument("-v", "--vectorized", action="store_true",
+                        help="run naked/hidden-single propagation on whole chunks with NumPy first")
+    parser.add_argument("--stats", metavar="FILE",
+                        help="write search statistics of every puzzle to FILE, one JSON object per line")
+    parser.add_argument("--verify", action="store_true",
+                        help="check every solution against its puzzle; failures are written as 'failed: <units>' "
+                             "and make the exit status 1")
+    args = parser.parse_args(argv)
+    if args.stats and (args.solver != "engine" or args.vectorized):
+        parser.error("--stats needs the engine solver and can't be combined with --vectorized")
+
+    if args.input != "-" and os.path.isfile(args.input) and is_packed(args.input):
+        # Packed files are read by the workers straight from the file
+        from packed import read_spans
+        stream = None
+        chunks = read_spans(args.input, args.chunk_size)
+    else:
+        stream = sys.stdin if args.input == "-" else open(args.input)
+        chunks = read_chunks(stream, args.chunk_size)
+    out = sys.stdout
+    stats_out = open(args.stats, "w") if args.stats else None
+    failed = 0
+    try:
+        with multiprocessing.Pool(args.jobs) as pool:
+            for number, result, stats in solve_stream(pool, chunks, args.solver, window=4 * args.jobs,
+                                                      ordered=not args.unordered, vectorized=args.vectorized,
+                                                      stats=stats_out is not None, verify=args.verify):
+                if result.startswith(FAILED):
+                    failed += 1
+                if args.unordered:
+                    out.write("{}\t{}\n".format(number, result))
+                else:
+                    out.write(result + "\n")
+                if stats_out is not None:
+                    record = {"line": number, "result": result if result in (INVALID, UNSOLVABLE) else
+                              FAILED if result.startswith(FAILED) else "solved"}
+                    record.update(stats or {})
+                    stats_out.write(json.dumps(record, sort_keys=True) + "\n")
+    finally:
+        if stream is not None and stream is not sys.stdin:
+            stream.close()
+        if stats_out is not None:
+            stats_out.close()
+    if failed:
+        sys.stderr.write("{} solutions failed verification\n".format(failed))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,307 @@
+# Reproducible solver benchmark.
+#
+# Runs solver backends over the bundled corpora in benchmarks/corpora (one
+# 81-character puzzle per line) and reports per-puzzle latency percentiles,
+# puzzles per second, search nodes and peak memory. Results are written as JSON
+# so they can be diffed, and compared against a stored baseline: the run fails
+# when throughput drops by more than the threshold or fewer puzzles are solved.
+#
+# Timings on a shared machine drift by tens of percent from one minute to the
+# next, so raw throughput alone can't tell a slower solver from a busier
+# machine. Every set is timed in several rounds, each between two runs of a
+# fixed pure-Python calibration loop, and a set only counts as a regression
+# when its median throughput drops both in puzzles per second and relative to
+# that loop. Sets too small to time reliably on their own are pooled per
+# backend before they are compared.
+#
+# Usage:
+#   python benchmark.py                          # compare with benchmarks/baseline.json
+#   python benchmark.py -s engine -c hard -r 5
+#   python benchmark.py --save-baseline          # record a new baseline
+#   python benchmark.py -f puzzles.sdk           # any text or packed puzzle file
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import dlx
+from core import parse_puzzle, valid
+from solver import Engine
+from solvers import get_solver, SOLVERS
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPORA_DIR = os.path.join(HERE, "benchmarks", "corpora")
+BASELINE = os.path.join(HERE, "benchmarks", "baseline.json")
+# Corpora in order of difficulty
+CORPORA = ("easy", "medium", "hard", "17clue", "adversarial")
+# Backends run by default; the naive backtracker takes minutes on the hard corpora
+DEFAULT_SOLVERS = ("engine", "dlx")
+# Allowed drop in puzzles per second before a run counts as a regression
+THRESHOLD = 0.25
+# Timed rounds over every set
+REPEAT = 5
+# Sets with fewer puzzles are pooled per backend for the regression gate
+MIN_GATE_PUZZLES = 50
+
+
+# Function to count the search nodes of the engine backend on a board
+def engine_nodes(board):
+    engine = Engine(board)
+    if engine.consistent:
+        engine.search()
+    return engine.nodes
+
+
+# Function to count the search nodes of the Dancing Links backend on a board
+def dlx_nodes(board):
+    dlx.solve(board)
+    return dlx.get_links(len(board)).nodes
+
+
+# Backends that can report how many search nodes they visited
+NODE_COUNTERS = {"engine": engine_nodes, "dlx": dlx_nodes}
+
+
+# Function to read a corpus file into a list of 9x9 boards
+def load_corpus(name):
+    with open(os.path.join(CORPORA_DIR, name + ".txt")) as f:
+        return [parse_puzzle(line) for line in f if line.strip()]
+
+
+# Function to read a puzzle file, text or packed (see packed.py), into a list of boards
+# (text files may hold 16x16 and 25x25 puzzles too)
+def load_file(path):
+    from packed import PuzzleFile, is_packed
+
+    if is_packed(path):
+        with PuzzleFile(path) as puzzles:
+            return [puzzles[i] for i in range(len(puzzles))]
+    with open(path) as f:
+        return [parse_puzzle(line) for line in f if line.strip()]
+
+
+# Function to check that solution is complete, follows the rules and keeps the givens
+def is_solution(puzzle, solution):
+    size = len(puzzle)
+    for r in range(size):
+        for c in range(size):
+            value = solution[r][c]
+            if not 1 <= value <= size or not valid(solution, value, (r, c)):
+                return False
+            if puzzle[r][c] and puzzle[r][c] != value:
+                return False
+    return True
+
+
+# Function to time the calibration loop: fixed pure-Python work that doesn't
+# depend on the code under test, to measure how fast the machine is right now
+def calibrate():
+    start = time.perf_counter()
+    counts = {}
+    for i in range(100000):
+        key = i % 97
+        counts[key] = counts.get(key, 0) + (i & 7)
+    return time.perf_counter() - start
+
+
+# Function to pick the median of a list
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2] if values else 0.0
+
+
+# Function to pick the p-th percentile (0-100) of a sorted list
+def percentile(values, p):
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+# Function to benchmark one backend on one corpus. The corpus is solved in
+# `repeat` rounds, each between two runs of the calibration loop. The fastest
+# run of every puzzle counts as its latency; throughput is the median of the
+# rounds, in puzzles per second and in puzzles per calibration loop.
+def run(solver, puzzles, repeat=REPEAT):
+    solve = get_solver(solver)
+    latencies = [None] * len(puzzles)
+    rounds = []
+    solved = 0
+    for k in range(repeat):
+        loop = calibrate()
+        total = 0.0
+        for i, puzzle in enumerate(puzzles):
+            board = [row[:] for row in puzzle]
+            start = time.perf_counter()
+            ok = solve(board)
+            elapsed = time.perf_counter() - start
+            total += elapsed
+            if latencies[i] is None or elapsed < latencies[i]:
+                latencies[i] = elapsed
+            if k == 0 and ok and is_solution(puzzle, board):
+                solved += 1
+        rounds.append((total, (loop + calibrate()) / 2))
+
+    # Search nodes and peak memory are measured in separate passes so they
+    # don't slow down the timed runs
+    nodes = None
+    if solver in NODE_COUNTERS:
+        nodes = sum(NODE_COUNTERS[solver]([row[:] for row in puzzle]) for puzzle in puzzles)
+    tracemalloc.start()
+    for puzzle in puzzles:
+        solve([row[:] for row in puzzle])
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    total = median([seconds for seconds, _ in rounds])
+    relative = median([len(puzzles) * loop / seconds for seconds, loop in rounds if seconds])
+    latencies.sort()
+    return {
+        "puzzles": len(puzzles),
+        "solved": solved,
+        "puzzles_per_sec": round(len(puzzles) / total, 2) if total else 0.0,
+        "puzzles_per_calibration": round(relative, 4),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 3),
+            "p90": round(percentile(latencies, 90) * 1000, 3),
+            "p99": round(percentile(latencies, 99) * 1000, 3),
+            "max": round(latencies[-1] * 1000, 3) if latencies else 0.0,
+        },
+        "nodes": nodes,
+        "nodes_per_puzzle": round(nodes / len(puzzles), 1) if nodes is not None and puzzles else None,
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+# Function to run every backend on every corpus and puzzle file and collect
+# the results. Files are reported under their file name.
+def run_all(solvers, corpora, repeat=REPEAT, out=sys.stderr, files=()):
+    results = {}
+    sets = [(corpus, lambda corpus=corpus: load_corpus(corpus)) for corpus in corpora]
+    sets += [(os.path.basename(path), lambda path=path: load_file(path)) for path in files]
+    for corpus, load in sets:
+        puzzles = load()
+        for solver in solvers:
+            result = run(solver, puzzles, repeat)
+            results[solver + "/" + corpus] = result
+            out.write("{:<24} {:>6}/{:<6} {:>10.1f}/s  p50 {:>8.3f} ms  p99 {:>8.3f} ms  nodes/puzzle {:>8}  peak {:>8.1f} KiB\n".format(
+                solver + "/" + corpus, result["solved"], result["puzzles"], result["puzzles_per_sec"],
+                result["latency_ms"]["p50"], result["latency_ms"]["p99"],
+                result["nodes_per_puzzle"] if result["nodes"] is not None else "-", result["peak_memory_kib"]))
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+# Function to pool the results of the sets with fewer than MIN_GATE_PUZZLES
+# puzzles into one "<backend>/small sets" entry per backend. Only the keys
+# in `keys` are pooled, so both sides of a comparison pool the same sets.
+def gate_entries(results, keys):
+    entries = {}
+    pooled = {}
+    for key in keys:
+        result = results[key]
+        if result["puzzles"] >= MIN_GATE_PUZZLES:
+            entries[key] = result
+            continue
+        pool = pooled.setdefault(key.split("/")[0] + "/small sets",
+                                 {"puzzles": 0, "solved": 0, "seconds": 0.0, "loops": 0.0})
+        pool["puzzles"] += result["puzzles"]
+        pool["solved"] += result["solved"]
+        if result["puzzles_per_sec"]:
+            pool["seconds"] += result["puzzles"] / result["puzzles_per_sec"]
+        if result.get("puzzles_per_calibration"):
+            pool["loops"] += result["puzzles"] / result["puzzles_per_calibration"]
+        else:
+            pool["loops"] = None
+    for key, pool in pooled.items():
+        entries[key] = {
+            "puzzles": pool["puzzles"],
+            "solved": pool["solved"],
+            "puzzles_per_sec": pool["puzzles"] / pool["seconds"] if pool["seconds"] else 0.0,
+            "puzzles_per_calibration": pool["puzzles"] / pool["loops"] if pool["loops"] else None,
+        }
+    return entries
+
+
+# Function to compare results with a baseline. A drop in throughput counts
+# when it shows both in puzzles per second and, if both sides have it, relative
+# to the calibration loop. Returns a list of regression messages.
+def compare(results, baseline, threshold=THRESHOLD):
+    regressions = []
+    keys = sorted(set(baseline["results"]) & set(results["results"]))
+    current_entries = gate_entries(results["results"], keys)
+    for key, base in sorted(gate_entries(baseline["results"], keys).items()):
+        current = current_entries[key]
+        if current["solved"] < base["solved"]:
+            regressions.append("{}: solved {} puzzles, baseline solved {}".format(key, current["solved"], base["solved"]))
+        metrics = ["puzzles_per_sec"]
+        if base.get("puzzles_per_calibration") and current.get("puzzles_per_calibration"):
+            metrics.append("puzzles_per_calibration")
+        drops = [1 - current[metric] / base[metric] for metric in metrics if base[metric]]
+        if drops and min(drops) > threshold:
+            regressions.append("{}: {:.1f} puzzles/s, baseline {:.1f} (-{})".format(
+                key, current["puzzles_per_sec"], base["puzzles_per_sec"],
+                ", -".join("{:.0f}%{}".format(100 * drop, " relative to the calibration loop" if k else "")
+                          for k, drop in enumerate(drops))))
+    return regressions
+
+
+# Function to write results as stable, diff-friendly JSON
+def write_json(data, path):
+    text = json.dumps(data, indent=2, sort_keys=True) + "\n"
+    if path == "-":
+        sys.stdout.write(text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Sudoku solver backends on the bundled corpora.")
+    parser.add_argument("-s", "--solver", action="append", choices=sorted(SOLVERS),
+                        help="backend to run, may be repeated (default: {})".format(", ".join(DEFAULT_SOLVERS)))
+    parser.add_argument("-c", "--corpus", action="append", choices=CORPORA,
+                        help="corpus to run, may be repeated (default: all, unless --file is given)")
+    parser.add_argument("-f", "--file", action="append", default=[],
+                        help="text or packed puzzle file to run as well, may be repeated")
+    parser.add_argument("-r", "--repeat", type=int, default=REPEAT,
+                        help="timed rounds over every set (default: {})".format(REPEAT))
+    parser.add_argument("-o", "--output", help="write the results as JSON to this file ('-' for stdout)")
+    parser.add_argument("--baseline", default=BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="allowed throughput drop as a fraction (default: {})".format(THRESHOLD))
+    args = parser.parse_args(argv)
+
+    corpora = args.corpus or ([] if args.file else CORPORA)
+    results = run_all(args.solver or DEFAULT_SOLVERS, corpora, args.repeat, files=args.file)
+    if args.output:
+        write_json(results, args.output)
+    if args.save_baseline:
+        write_json(results, args.baseline)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        sys.stderr.write("No baseline at {}, nothing to compare\n".format(args.baseline))
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    for message in regressions:
+        sys.stderr.write("REGRESSION " + message + "\n")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
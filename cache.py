@@ -0,0 +1,258 @@
+# Solution cache keyed by the canonical form of a puzzle.
+#
+# Two puzzles that only differ by relabeled digits, permuted bands or stacks,
+# permuted rows inside a band or columns inside a stack, or a transpose have
+# the same solution up to that same transformation. The cache brings every
+# puzzle into a canonical form, looks up (or computes) the solution of the
+# canonical puzzle and maps it back to the caller's orientation and digits.
+#
+# The canonical form: bands, stacks, rows and columns are ordered by
+# signatures that these transformations can't change (clue counts and how
+# often the digits of a line occur in the whole grid). Lines with equal
+# signatures are tried in every order, the digits of each candidate are
+# relabeled by first appearance, and the smallest result wins. When the ties
+# allow more than MAX_ARRANGEMENTS orders only the first one is used; such
+# puzzles may then miss the cache in another orientation, but the answers are
+# always right because the exact transformation is mapped back.
+#
+# Solutions live in an in-memory LRU of bounded size and, optionally, in a
+# dbm file that survives restarts.
+
+import dbm
+import itertools
+from collections import OrderedDict
+
+from core import DIGITS, box_size
+from solver import solve as engine_solve
+
+# Number of canonical solutions kept in memory by default
+CAPACITY = 100000
+# Largest number of tied orders tried when looking for the canonical form
+MAX_ARRANGEMENTS = 4096
+# Stored in place of a solution for puzzles without one
+NO_SOLUTION = "-"
+
+
+# Function to list every order of items that keeps them sorted by key.
+# Items with equal keys can come in any order among themselves.
+def tied_orders(items, key):
+    items = sorted(items, key=key)
+    groups = [list(group) for _, group in itertools.groupby(items, key=key)]
+    for choice in itertools.product(*[itertools.permutations(group) for group in groups]):
+        yield [item for group in choice for item in group]
+
+
+# Function to count the orders tied_orders() yields
+def count_orders(items, key):
+    count = 1
+    for _, group in itertools.groupby(sorted(items, key=key), key=key):
+        for k in range(2, len(list(group)) + 1):
+            count *= k
+    return count
+
+
+# Function to compute the signature of every line (row) of a grid: its clue
+# count, its clues per box, and how often its digits occur in the whole grid
+def line_signatures(grid, box, freq):
+    size = box * box
+    return [(size - row.count(0),
+             tuple(sorted(box - row[k:k + box].count(0) for k in range(0, size, box))),
+             tuple(sorted([freq[v] for v in row if v]))) for row in grid]
+
+
+# Function to order bands and the lines inside them by their signatures.
+# Returns every order of the line indexes the signatures allow, how many
+# there are, and the signature of the whole set of bands.
+def line_orders(lines, box):
+    bands = [tuple(sorted(lines[b * box:(b + 1) * box])) for b in range(box)]
+    band_key = bands.__getitem__
+    line_key = lines.__getitem__
+
+    count = count_orders(range(box), band_key)
+    for b in range(box):
+        count *= count_orders(range(b * box, (b + 1) * box), line_key)
+
+    def orders():
+        for band_order in tied_orders(range(box), band_key):
+            inner = [tied_orders(range(b * box, (b + 1) * box), line_key) for b in band_order]
+            for rows in itertools.product(*inner):
+                yield [r for band in rows for r in band]
+
+    return orders(), count, tuple(sorted(bands))
+
+
+# Function to transpose a list board
+def transpose(grid):
+    return [list(col) for col in zip(*grid)]
+
+
+# Function to find the canonical form of a square board. Returns the canonical
+# puzzle as a string (DIGITS, "0" for empty cells) and the transformation that
+# maps the board onto it: (transposed, row order, column order, digit map).
+def canonical_form(board):
+    grid = [[int(value) for value in row] for row in board]
+    size = len(grid)
+    box = box_size(size)
+    freq = [0] * (size + 1)
+    for row in grid:
+        for value in row:
+            freq[value] += 1
+
+    # Both orientations are tried unless their signatures already tell them apart
+    flipped = transpose(grid)
+    row_lines = line_signatures(grid, box, freq)
+    col_lines = line_signatures(flipped, box, freq)
+    candidates = []
+    for transposed, g, rows, cols in ((False, grid, row_lines, col_lines), (True, flipped, col_lines, row_lines)):
+        row_orders, row_count, row_sig = line_orders(rows, box)
+        col_orders, col_count, col_sig = line_orders(cols, box)
+        candidates.append(((row_sig, col_sig), transposed, g, row_orders, row_count, col_orders, col_count))
+    best_sig = min(candidate[0] for candidate in candidates)
+    candidates = [candidate for candidate in candidates if candidate[0] == best_sig]
+    if len(candidates) == 2 and candidates[0][4] * candidates[0][6] * 2 > MAX_ARRANGEMENTS:
+        candidates = candidates[:1]
+
+    best = None
+    for _, transposed, g, row_orders, row_count, col_orders, col_count in candidates:
+        if row_count * col_count > MAX_ARRANGEMENTS:
+            # Too many ties: settle for the first order
+            row_orders = itertools.islice(row_orders, 1)
+            col_orders = [next(col_orders)]
+        else:
+            col_orders = list(col_orders)
+        for rows in row_orders:
+            lines = [g[r] for r in rows]
+            for cols in col_orders:
+                relabel = {}
+                cells = []
+                for line in lines:
+                    for c in cols:
+                        value = line[c]
+                        if value:
+                            if value not in relabel:
+                                relabel[value] = len(relabel) + 1
+                            cells.append(relabel[value])
+                        else:
+                            cells.append(0)
+                if best is None or cells < best[0]:
+                    best = (cells, transposed, rows, cols, relabel)
+
+    cells, transposed, rows, cols, relabel = best
+    # Digits that are not among the clues get the remaining labels in order
+    for value in range(1, size + 1):
+        if value not in relabel:
+            relabel[value] = len(relabel) + 1
+    key = "".join(DIGITS[v - 1] if v else "0" for v in cells)
+    return key, (transposed, rows, cols, relabel)
+
+
+# Function to build the canonical puzzle of a key as a list board
+def key_board(key, size):
+    values = [DIGITS.index(ch) + 1 if ch != "0" else 0 for ch in key]
+    return [values[r * size:(r + 1) * size] for r in range(size)]
+
+
+# Function to write the canonical solution (a key-style string) back into the
+# caller's board, undoing the transformation
+def map_back(solution, transform, board):
+    transposed, rows, cols, relabel = transform
+    size = len(rows)
+    digit = {DIGITS[label - 1]: value for value, label in relabel.items()}
+    for i, r in enumerate(rows):
+        for j, c in enumerate(cols):
+            value = digit[solution[i * size + j]]
+            if transposed:
+                board[c][r] = value
+            else:
+                board[r][c] = value
+
+
+# A solver backend with a cache of canonical solutions in front of it
+class SolutionCache:
+    # solve is the backend used on cache misses (the engine by default). With
+    # a path, solutions are also kept in a dbm file at that path.
+    def __init__(self, capacity=CAPACITY, path=None, solve=engine_solve):
+        self.capacity = capacity
+        self.backend = solve
+        self.entries = OrderedDict()
+        self.store = dbm.open(path, "c") if path else None
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # Returns the canonical solution for a key, None if it isn't cached
+    def lookup(self, key):
+        solution = self.entries.get(key)
+        if solution is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return solution
+        if self.store is not None:
+            stored = self.store.get(key)
+            if stored is not None:
+                self.store_hits += 1
+                solution = stored.decode("ascii")
+                self.remember(key, solution)
+                return solution
+        return None
+
+    # Adds a canonical solution to the in-memory LRU, evicting the oldest entries
+    def remember(self, key, solution):
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    # Solves the board in place, returns True if a solution was found
+    def solve(self, board):
+        size = len(board)
+        if any(not 0 <= int(value) <= size for row in board for value in row):
+            # Values outside the board's digits have no canonical form; the
+            # engine reports such boards as unsolvable, so the cache does too
+            return False
+        key, transform = canonical_form(board)
+        solution = self.lookup(key)
+        if solution is None:
+            self.misses += 1
+            canonical = key_board(key, len(board))
+            solution = "".join(DIGITS[v - 1] for row in canonical for v in row) if self.backend(canonical) \
+                else NO_SOLUTION
+            self.remember(key, solution)
+            if self.store is not None:
+                self.store[key] = solution
+        if solution == NO_SOLUTION:
+            return False
+        map_back(solution, transform, board)
+        return True
+
+    # Returns the hit and miss counters as a dict
+    def metrics(self):
+        lookups = self.hits + self.store_hits + self.misses
+        return {
+            "hits": self.hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self.entries),
+            "hit_rate": round((self.hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+    # Writes the persistent store to disk and closes it
+    def close(self):
+        if self.store is not None:
+            self.store.close()
+            self.store = None
+
+
+# Cache shared by the "cached" solver backend, created on first use
+_shared = None
+
+
+# Function to solve the Sudoku in place through the shared in-memory cache
+def solve(board):
+    global _shared
+    if _shared is None:
+        _shared = SolutionCache()
+    return _shared.solve(board)
@@ -0,0 +1,125 @@
+# Headless Sudoku core: parsing, validation and solving.
+#
+# Importing this module has no side effects and pulls in neither pygame nor
+# NumPy, so services and worker processes can use it without a display. NumPy
+# is only imported by create_matrix() and the vectorized batch paths.
+
+from solver import solve, solve_unique
+
+# One character per digit in puzzle lines: 1-9, then A-P for 10-25 (16x16 uses
+# up to G, 25x25 up to P). "0" and "." mark empty cells.
+DIGITS = "123456789ABCDEFGHIJKLMNOP"
+# Board sizes that puzzle lines can hold, keyed by line length
+SIZES = {size * size: size for size in (9, 16, 25)}
+
+
+# Function to get the box size of a size x size board (3 for 9x9)
+def box_size(size):
+    return int(round(size ** 0.5))
+
+
+# Function to create a square matrix from a flat list (9x9 for 81 values)
+def create_matrix(li):
+    import numpy as np
+
+    size = box_size(len(li))
+    matrix = np.zeros((size, size), dtype=int)
+    for i in range(size):
+        for j in range(size):
+            matrix[i, j] = li[i*size + j]
+    return matrix
+
+# Function to turn a puzzle line into a list board, None if malformed. A line
+# holds 81, 256 or 625 characters from DIGITS ("0" or "." for empty cells), or
+# the same number of values written as numbers separated by spaces or commas.
+def parse_puzzle(line):
+    line = line.strip()
+    if " " in line or "," in line:
+        try:
+            values = [int(value) for value in line.replace(",", " ").split()]
+        except ValueError:
+            return None
+        size = SIZES.get(len(values))
+        if size is None or not all(0 <= value <= size for value in values):
+            return None
+    else:
+        size = SIZES.get(len(line))
+        if size is None:
+            return None
+        values = []
+        for ch in line.upper():
+            if ch == "." or ch == "0":
+                values.append(0)
+            else:
+                value = DIGITS.find(ch) + 1
+                if not 0 < value <= size:
+                    return None
+                values.append(value)
+    return [values[i * size:i * size + size] for i in range(size)]
+
+# Function to turn a board back into a puzzle line, one DIGITS character per cell
+def format_puzzle(board):
+    return "".join(DIGITS[int(value) - 1] if value else "0" for row in board for value in row)
+
+# Function to print the Sudoku board
+def print_sudoku(board):
+    size = len(board)
+    box = box_size(size)
+    width = len(str(size))
+    for i in range(size):
+        if i % box == 0 and i != 0:
+            print("- " * ((width + 2) * size // 2 + box - 1))
+        for j in range(size):
+            if j % box == 0 and j != 0:
+                print("|", end=" ")
+            if j == size - 1:
+                print(str(board[i][j]).rjust(width))
+            else:
+                print(str(board[i][j]).rjust(width) + " ", end=" ")
+
+# Function to find an empty space in the board
+def find_empty(board):
+    for i in range(len(board)):
+        for j in range(len(board[0])):
+            if board[i][j] == 0:
+                return (i, j)
+    return None
+
+# Function to check if the current board is valid
+def valid(bo, num, pos):
+    # Check row
+    for i in range(len(bo[0])):
+        if bo[pos[0]][i] == num and pos[1] != i:
+            return False
+
+    # Check column
+    for i in range(len(bo)):
+        if bo[i][pos[1]] == num and pos[0] != i:
+            return False
+
+    # Check box
+    box = box_size(len(bo))
+    box_x = pos[1] // box
+    box_y = pos[0] // box
+
+    for i in range(box_y*box, box_y*box + box):
+        for j in range(box_x * box, box_x*box + box):
+            if bo[i][j] == num and (i,j) != pos:
+                return False
+
+    return True
+
+# Function to solve the Sudoku with the plain backtracking algorithm
+def naive_solve(board):
+    find = find_empty(board)
+    if not find:
+        return True
+    else:
+        row, col = find
+    for i in range(1, len(board) + 1):
+        if valid(board, i, (row, col)):
+            board[row][col] = i
+            if naive_solve(board):
+                return True
+            board[row][col] = 0
+    return False
@@ -0,0 +1,198 @@
+# Dancing Links (Knuth's Algorithm X) exact-cover backend.
+#
+# Sudoku is an exact-cover problem with 729 rows (one per cell/digit choice)
+# and 324 columns (each cell filled once, each digit once per row, column and
+# box); larger boards work the same way with size^3 rows and 4 * size^2
+# columns. The doubly linked matrix is stored in flat lists ("the node arena")
+# and built only once per board size. Every puzzle covers the columns of its
+# givens, searches and then uncovers everything in reverse order, which leaves
+# the arena exactly as it was for the next puzzle.
+
+from solver import get_layout
+
+
+class DancingLinks:
+    # Builds the matrix of a size x size board (324 columns for 9x9) with one
+    # 4-node row per (cell, digit) choice
+    def __init__(self, size=9):
+        layout = get_layout(size)
+        self.layout = layout
+        cells = layout.cells
+        # Number of constraint columns and candidate rows of the exact-cover matrix
+        columns = 4 * cells
+        choices = cells * size
+        # Node 0 is the root, nodes 1..columns are the column headers
+        headers = columns + 1
+        total = headers + 4 * choices
+        self.left = [0] * total
+        self.right = [0] * total
+        self.up = list(range(total))
+        self.down = list(range(total))
+        self.column = list(range(total))
+        self.size = [0] * headers
+        # Choice (cell * size + digit - 1) that every row node belongs to
+        self.choice = [-1] * total
+
+        for c in range(headers):
+            self.left[c] = c - 1 if c else columns
+            self.right[c] = c + 1 if c < columns else 0
+
+        node = headers
+        for choice in range(choices):
+            cell, d = divmod(choice, size)
+            cols = (cell,
+                    cells + layout.row_of[cell] * size + d,
+                    2 * cells + layout.col_of[cell] * size + d,
+                    3 * cells + layout.box_of[cell] * size + d)
+            first = node
+            for k, col in enumerate(cols):
+                c = col + 1
+                # Append the node at the bottom of its column
+                self.column[node] = c
+                self.up[node] = self.up[c]
+                self.down[node] = c
+                self.down[self.up[c]] = node
+                self.up[c] = node
+                self.size[c] += 1
+                # Link the four nodes of the row into a ring
+                self.left[node] = node - 1 if k else first + 3
+                self.right[node] = node + 1 if k < 3 else first
+                self.choice[node] = choice
+                node += 1
+        # First node of every choice row, used to apply the givens
+        self.row_start = [headers + 4 * choice for choice in range(choices)]
+        # Whether each column is currently covered, used to detect clashing givens
+        self.covered = [False] * headers
+        # Search nodes visited by the last solve()
+        self.nodes = 0
+
+    # Removes column c and every row that intersects it
+    def cover(self, c):
+        left, right, up, down, column, size = \
+            self.left, self.right, self.up, self.down, self.column, self.size
+        right[left[c]] = right[c]
+        left[right[c]] = left[c]
+        self.covered[c] = True
+        i = down[c]
+        while i != c:
+            j = right[i]
+            while j != i:
+                down[up[j]] = down[j]
+                up[down[j]] = up[j]
+                size[column[j]] -= 1
+                j = right[j]
+            i = down[i]
+
+    # Exact inverse of cover(c)
+    def uncover(self, c):
+        left, right, up, down, column, size = \
+            self.left, self.right, self.up, self.down, self.column, self.size
+        i = up[c]
+        while i != c:
+            j = left[i]
+            while j != i:
+                size[column[j]] += 1
+                down[up[j]] = j
+                up[down[j]] = j
+                j = left[j]
+            i = up[i]
+        right[left[c]] = c
+        left[right[c]] = c
+        self.covered[c] = False
+
+    # Takes the row containing node into the partial solution
+    def select(self, node):
+        self.cover(self.column[node])
+        j = self.right[node]
+        while j != node:
+            self.cover(self.column[j])
+            j = self.right[j]
+
+    # Exact inverse of select(node)
+    def deselect(self, node):
+        j = self.left[node]
+        while j != node:
+            self.uncover(self.column[j])
+            j = self.left[j]
+        self.uncover(self.column[node])
+
+    # Algorithm X: branch on the column with the fewest remaining rows
+    def search(self, solution):
+        self.nodes += 1
+        right, size = self.right, self.size
+        if right[0] == 0:
+            return True
+        best = right[0]
+        c = right[best]
+        while c != 0 and size[best] > 1:
+            if size[c] < size[best]:
+                best = c
+            c = right[c]
+        r = self.down[best]
+        while r != best:
+            solution.append(r)
+            self.select(r)
+            found = self.search(solution)
+            self.deselect(r)
+            if found:
+                return True
+            solution.pop()
+            r = self.down[r]
+        return False
+
+    # Solves a board of the arena's size in place, returns True if a solution was found
+    def solve(self, board):
+        layout = self.layout
+        size = layout.size
+        self.nodes = 0
+        givens = []
+        consistent = True
+        for cell in range(layout.cells):
+            value = int(board[layout.row_of[cell]][layout.col_of[cell]])
+            if not value:
+                continue
+            if not 0 < value <= size:
+                consistent = False
+                break
+            node = self.row_start[cell * size + value - 1]
+            # A clash between givens shows up as an already covered column
+            j = node
+            while True:
+                if self.covered[self.column[j]]:
+                    consistent = False
+                j = self.right[j]
+                if j == node:
+                    break
+            if not consistent:
+                break
+            self.select(node)
+            givens.append(node)
+
+        solution = []
+        found = consistent and self.search(solution)
+
+        # Restore the arena for the next puzzle
+        for node in reversed(givens):
+            self.deselect(node)
+
+        if found:
+            for node in solution:
+                cell, d = divmod(self.choice[node], size)
+                board[layout.row_of[cell]][layout.col_of[cell]] = d + 1
+        return found
+
+
+# Shared arenas, keyed by board size and built on first use
+_links = {}
+
+
+# Function to get the shared arena of a board size, building it on first use
+def get_links(size=9):
+    if size not in _links:
+        _links[size] = DancingLinks(size)
+    return _links[size]
+
+
+# Function to solve the Sudoku in place with Dancing Links
+def solve(board):
+    return get_links(len(board)).solve(board)
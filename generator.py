@@ -0,0 +1,202 @@
+# Puzzle generator.
+#
+# A puzzle is made by building a random full grid, then removing clues in
+# random order and putting back every clue whose removal makes the solution
+# ambiguous (checked with the engine's solution counter, which stops at 2).
+# Every puzzle is tagged with a difficulty tier, the level hints.rate gives it
+# (the same rating the game shows). PuzzlePool keeps a stock of
+# fresh puzzles per tier, filled ahead of time by a multiprocessing pool, so a
+# new game never has to wait for the generator.
+#
+# Usage:
+#   python generator.py --count 1000 --tier expert > puzzles.txt
+#   python generator.py --count 10 --size 16 > puzzles16.txt
+
+import argparse
+import multiprocessing
+import random
+import sys
+import threading
+from collections import deque
+
+from core import format_puzzle
+from hints import LEVELS, rate
+from solver import Engine, get_layout
+
+# Difficulty tiers, from easiest to hardest, by the hardest technique needed:
+#   easy   - singles
+#   medium - pointing, box-line reduction, pairs and triples
+#   hard   - X-Wing, Swordfish
+#   expert - needs guessing (search)
+TIERS = LEVELS
+# Tiers PuzzlePool stocks by default. Hard puzzles are rare among generated
+# ones (about 1 in 200 on 9x9), so a stock of them would take ages to fill.
+POOL_TIERS = ("easy", "medium", "expert")
+# Clues left in place when generating each tier, per board size. 9x9 puzzles
+# above easy get as many clues removed as possible; on larger boards proving
+# uniqueness gets very slow below these counts.
+TARGET_CLUES = {
+    9: {"easy": 40, "medium": 0, "hard": 0, "expert": 0},
+    16: {"easy": 150, "medium": 110, "hard": 110, "expert": 110},
+    25: {"easy": 400, "medium": 320, "hard": 320, "expert": 320},
+}
+# Attempts to hit the requested tier before returning the last puzzle anyway
+ATTEMPTS = 20
+
+
+# Function to turn a flat list of values (81 for 9x9) into a list board
+def to_rows(cells):
+    size = int(round(len(cells) ** 0.5))
+    return [list(cells[r * size:(r + 1) * size]) for r in range(size)]
+
+
+# Function to build a full grid from the classic base pattern with its bands,
+# stacks, rows inside bands and columns inside stacks shuffled
+def pattern_solution(rng, size):
+    box = get_layout(size).box
+    rows = [band * box + r for band in rng.sample(range(box), box) for r in rng.sample(range(box), box)]
+    cols = [stack * box + c for stack in rng.sample(range(box), box) for c in rng.sample(range(box), box)]
+    return [(box * (r % box) + r // box + c) % size + 1 for r in rows for c in cols]
+
+
+# Function to build a random full grid of a size, returned as a flat list of values
+def random_solution(rng=random, size=9):
+    box = get_layout(size).box
+    if box > 4:
+        # Completing a 25x25 grid with the search can take minutes, so larger
+        # boards use a shuffled pattern grid instead
+        cells = pattern_solution(rng, size)
+    else:
+        board = [[0] * size for _ in range(size)]
+        # The boxes on the diagonal don't share a unit, so any digit order fits
+        for b in range(box):
+            digits = rng.sample(range(1, size + 1), size)
+            for k in range(size):
+                board[b * box + k // box][b * box + k % box] = digits[k]
+        engine = Engine(board)
+        engine.search()
+        cells = engine.cells
+    # Relabel the digits so the engine's fixed search order doesn't show
+    relabel = [0] + rng.sample(range(1, size + 1), size)
+    return [relabel[value] for value in cells]
+
+
+# Function to check that a flat puzzle has exactly one solution
+def is_unique(cells):
+    engine = Engine(to_rows(cells))
+    return engine.consistent and engine.count(2, []) == 1
+
+
+# Function to remove clues from a full grid, keeping the solution unique,
+# until only `clues` are left or no more can be removed
+def remove_clues(solution, clues, rng=random):
+    puzzle = list(solution)
+    left = cells = len(solution)
+    for i in rng.sample(range(cells), cells):
+        if left <= clues:
+            break
+        puzzle[i] = 0
+        if is_unique(puzzle):
+            left -= 1
+        else:
+            puzzle[i] = solution[i]
+    return puzzle
+
+
+# Function to generate one size x size puzzle of the requested tier (any tier
+# if None). Returns the puzzle as a flat list of values and its actual tier.
+def generate(tier=None, rng=random, size=9):
+    for _ in range(ATTEMPTS):
+        targets = TARGET_CLUES[size]
+        target = targets[tier] if tier else rng.choice(list(targets.values()))
+        puzzle = remove_clues(random_solution(rng, size), target, rng)
+        rating = rate(to_rows(puzzle))[0]
+        if tier is None or rating == tier:
+            break
+    return puzzle, rating
+
+
+# Worker function for the process pool: generates a puzzle from a seed
+def generate_seeded(args):
+    tier, seed, size = args
+    return generate(tier, random.Random(seed), size)
+
+
+# A stock of fresh puzzles per tier, refilled in the background
+class PuzzlePool:
+    def __init__(self, target=1000, processes=None, tiers=POOL_TIERS, size=9):
+        self.target = target  # Puzzles to keep ready per tier
+        self.size = size  # Board size of the puzzles
+        self.processes = processes or multiprocessing.cpu_count()
+        self.puzzles = {tier: deque() for tier in tiers}
+        self.wakeup = threading.Event()
+        self.stopped = False
+        self.thread = None
+
+    # Starts the background filler
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.fill, daemon=True)
+            self.thread.start()
+        return self
+
+    # Stops the background filler and its worker processes
+    def stop(self):
+        self.stopped = True
+        self.wakeup.set()
+
+    # Number of ready puzzles of a tier
+    def ready(self, tier):
+        return len(self.puzzles[tier])
+
+    # Background loop: asks the workers for puzzles of the tiers that are
+    # running low and sorts the results by their actual tier
+    def fill(self):
+        seeds = random.SystemRandom()
+        with multiprocessing.Pool(self.processes) as pool:
+            while not self.stopped:
+                missing = [tier for tier, stock in self.puzzles.items() if len(stock) < self.target]
+                if not missing:
+                    self.wakeup.wait(1)
+                    self.wakeup.clear()
+                    continue
+                tasks = [(missing[k % len(missing)], seeds.getrandbits(64), self.size)
+                         for k in range(4 * self.processes)]
+                for puzzle, tier in pool.imap_unordered(generate_seeded, tasks):
+                    if self.stopped:
+                        break
+                    if tier in self.puzzles and len(self.puzzles[tier]) < self.target:
+                        self.puzzles[tier].append(puzzle)
+
+    # Returns a fresh puzzle of a tier as a list board. Comes straight from
+    # the stock when there is one, otherwise it is generated right away.
+    def take(self, tier="medium"):
+        self.wakeup.set()
+        try:
+            puzzle = self.puzzles[tier].popleft()
+        except (KeyError, IndexError):
+            puzzle, _ = generate(tier, size=self.size)
+        return to_rows(puzzle)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Sudoku puzzles with a unique solution.")
+    parser.add_argument("-n", "--count", type=int, default=100, help="number of puzzles to generate")
+    parser.add_argument("-t", "--tier", choices=TIERS, help="difficulty tier (default: any)")
+    parser.add_argument("-j", "--jobs", type=int, default=multiprocessing.cpu_count(), help="number of worker processes")
+    parser.add_argument("--show-tier", action="store_true", help="append the tier to every line, separated by a tab")
+    parser.add_argument("--seed", type=int, help="seed for reproducible output")
+    parser.add_argument("--size", type=int, default=9, choices=(9, 16, 25), help="board size (default: 9)")
+    args = parser.parse_args(argv)
+
+    seeds = random.Random(args.seed) if args.seed is not None else random.SystemRandom()
+    tasks = [(args.tier, seeds.getrandbits(64), args.size) for _ in range(args.count)]
+    with multiprocessing.Pool(args.jobs) as pool:
+        for puzzle, tier in pool.imap(generate_seeded, tasks, chunksize=4):
+            line = format_puzzle(to_rows(puzzle))
+            sys.stdout.write(line + "\t" + tier + "\n" if args.show_tier else line + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
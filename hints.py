@@ -0,0 +1,352 @@
+# Logical hints and difficulty ratings.
+#
+# LogicBoard keeps one candidate bitmask per cell (bit d - 1 set when digit d
+# can still go there) and looks for the next move a person could find, trying
+# the techniques in order of cost:
+#
+#   naked single, hidden single           - place a digit
+#   pointing, box-line reduction,
+#   naked/hidden pair, naked/hidden triple,
+#   X-Wing, Swordfish                     - remove candidates
+#
+# A move is returned as a Move with the technique, the digits it places or
+# the candidates it removes, and a readable reason. Every technique works on
+# any board size the engine supports. rate() applies moves until the puzzle is
+# solved and rates it by the hardest technique it needed.
+#
+# Usage:
+#   python hints.py 070000043040009610800634900094052000358460020000800530080070091902100005007040802
+
+import itertools
+import sys
+
+from core import parse_puzzle
+from solver import Engine
+
+# Difficulty levels of rate(), from easiest to hardest:
+#   easy   - singles alone solve it
+#   medium - needs pointing, box-line reduction, pairs or triples
+#   hard   - needs an X-Wing or a Swordfish
+#   expert - these techniques get stuck, it needs guessing (or has no solution)
+LEVELS = ("easy", "medium", "hard", "expert")
+
+# Peers of every cell (the other cells of its row, column and box) per board size
+PEERS = {}
+
+
+# Function to get the peers of every cell of a layout, building them on first use
+def get_peers(layout):
+    if layout.size not in PEERS:
+        peers = [set() for _ in range(layout.cells)]
+        for unit in layout.units:
+            for i in unit:
+                peers[i].update(unit)
+        for i in range(layout.cells):
+            peers[i].discard(i)
+        PEERS[layout.size] = [sorted(p) for p in peers]
+    return PEERS[layout.size]
+
+
+# Function to name a cell in row/column notation, e.g. r3c5
+def cell_name(i, size):
+    return "r{}c{}".format(i // size + 1, i % size + 1)
+
+
+# Function to name unit u of a layout, e.g. "row 3" or "box 5"
+def unit_name(u, size):
+    return ("row", "column", "box")[u // size] + " " + str(u % size + 1)
+
+
+# Function to list the digits of a mask, e.g. "3/8"
+def digits_text(mask):
+    return "/".join(str(d + 1) for d in range(mask.bit_length()) if mask >> d & 1)
+
+
+# A deduction: the technique that found it, the (cell, value) pairs it
+# places, the (cell, value) candidates it removes, and why
+class Move:
+    def __init__(self, technique, placements=(), eliminations=(), reason=""):
+        self.technique = technique
+        self.placements = list(placements)
+        self.eliminations = list(eliminations)
+        self.reason = reason
+
+    def __repr__(self):
+        return "Move({!r}, {!r}, {!r}, {!r})".format(self.technique, self.placements, self.eliminations, self.reason)
+
+
+# Candidate bitboards of a square board (list of lists, 0 for empty cells).
+# eliminated holds (cell, value) candidates removed by earlier moves.
+class LogicBoard:
+    def __init__(self, board, eliminated=()):
+        engine = Engine(board)
+        self.layout = layout = engine.layout
+        self.size = layout.size
+        self.peers = get_peers(layout)
+        self.cells = list(engine.cells)
+        self.candidates = [0 if engine.cells[i] else engine.candidates(i) for i in range(layout.cells)]
+        for i, value in eliminated:
+            self.candidates[i] &= ~(1 << (value - 1))
+        # False if two givens clash
+        self.consistent = engine.consistent
+
+    # True if no cell is empty
+    def solved(self):
+        return 0 not in self.cells
+
+    # True if the givens clash or an empty cell has no candidate left
+    def broken(self):
+        if not self.consistent:
+            return True
+        return any(not value and not cand for value, cand in zip(self.cells, self.candidates))
+
+    # Places value into cell i and removes it from the candidates of its peers
+    def place(self, i, value):
+        bit = 1 << (value - 1)
+        self.cells[i] = value
+        self.candidates[i] = 0
+        for j in self.peers[i]:
+            self.candidates[j] &= ~bit
+
+    # Applies the placements and eliminations of a move
+    def apply(self, move):
+        for i, value in move.placements:
+            self.place(i, value)
+        for i, value in move.eliminations:
+            self.candidates[i] &= ~(1 << (value - 1))
+
+    # Returns the next move found by the cheapest technique that finds one,
+    # None if the board is solved, broken or too hard for these techniques
+    def next_move(self):
+        if self.broken():
+            return None
+        for name, level, technique in TECHNIQUES:
+            move = technique(self)
+            if move is not None:
+                return move
+        return None
+
+    # Bitmask of the positions (indexes into the unit) where digit bit can go
+    def positions(self, unit, bit):
+        mask = 0
+        for k, i in enumerate(unit):
+            if self.candidates[i] & bit:
+                mask |= 1 << k
+        return mask
+
+    # (cell, value) eliminations of the digits in mask from cells, only where they are candidates
+    def removals(self, cells, mask):
+        return [(i, d + 1) for i in cells for d in range(self.size) if self.candidates[i] & mask & (1 << d)]
+
+
+# Technique: a cell with a single candidate
+def naked_single(board):
+    popcount, digit_of = board.layout.popcount, board.layout.digit_of
+    for i, cand in enumerate(board.candidates):
+        if cand and popcount[cand] == 1:
+            value = digit_of[cand]
+            return Move("naked single", [(i, value)],
+                        reason="{} can only be {}".format(cell_name(i, board.size), value))
+    return None
+
+
+# Technique: a digit that fits in only one cell of a unit
+def hidden_single(board):
+    size = board.size
+    for u, unit in enumerate(board.layout.units):
+        seen = once = 0
+        for i in unit:
+            cand = board.candidates[i]
+            once = (once & ~cand) | (cand & ~seen)
+            seen |= cand
+        if once:
+            bit = once & -once
+            value = board.layout.digit_of[bit]
+            for i in unit:
+                if board.candidates[i] & bit:
+                    return Move("hidden single", [(i, value)],
+                                reason="{} can only go in {} within {}".format(value, cell_name(i, size), unit_name(u, size)))
+    return None
+
+
+# Technique: inside a box, a digit's candidates all lie in one row or column,
+# so it can't go anywhere else in that row or column
+def pointing(board):
+    layout, size = board.layout, board.size
+    for b in range(size):
+        box = layout.units[2 * size + b]
+        for d in range(size):
+            bit = 1 << d
+            cells = [i for i in box if board.candidates[i] & bit]
+            if len(cells) < 2:
+                continue
+            for line_of, offset in ((layout.row_of, 0), (layout.col_of, size)):
+                lines = {line_of[i] for i in cells}
+                if len(lines) == 1:
+                    u = offset + lines.pop()
+                    others = [i for i in layout.units[u] if layout.box_of[i] != b]
+                    removed = board.removals(others, bit)
+                    if removed:
+                        return Move("pointing", eliminations=removed, reason="in {}, {} is only in {}, so it goes nowhere else in that {}".format(
+                            unit_name(2 * size + b, size), d + 1, unit_name(u, size), ("row", "column")[offset // size]))
+    return None
+
+
+# Technique: inside a row or column, a digit's candidates all lie in one box,
+# so it can't go anywhere else in that box
+def box_line(board):
+    layout, size = board.layout, board.size
+    for u in range(2 * size):
+        line = layout.units[u]
+        for d in range(size):
+            bit = 1 << d
+            boxes = {layout.box_of[i] for i in line if board.candidates[i] & bit}
+            if len(boxes) != 1:
+                continue
+            b = boxes.pop()
+            others = [i for i in layout.units[2 * size + b] if i not in line]
+            removed = board.removals(others, bit)
+            if removed:
+                return Move("box-line reduction", eliminations=removed, reason="in {}, {} is only in {}, so it goes nowhere else in that box".format(
+                    unit_name(u, size), d + 1, unit_name(2 * size + b, size)))
+    return None
+
+
+# Function to find n cells of a unit whose candidates are n digits in all;
+# those digits can't go anywhere else in the unit
+def naked_subset(board, n, name):
+    popcount, size = board.layout.popcount, board.size
+    for u, unit in enumerate(board.layout.units):
+        small = [i for i in unit if board.candidates[i] and popcount[board.candidates[i]] <= n]
+        for group in itertools.combinations(small, n):
+            mask = 0
+            for i in group:
+                mask |= board.candidates[i]
+            if popcount[mask] != n:
+                continue
+            removed = board.removals([i for i in unit if i not in group], mask)
+            if removed:
+                return Move(name, eliminations=removed, reason="{} are the only candidates of {} in {}".format(
+                    digits_text(mask), ", ".join(cell_name(i, size) for i in group), unit_name(u, size)))
+    return None
+
+
+# Function to find n digits of a unit that fit in only the same n cells; those
+# cells can't hold any other digit
+def hidden_subset(board, n, name):
+    size = board.size
+    for u, unit in enumerate(board.layout.units):
+        places = {}
+        for d in range(size):
+            mask = board.positions(unit, 1 << d)
+            if 2 <= bin(mask).count("1") <= n:
+                places[d] = mask
+        for digits in itertools.combinations(sorted(places), n):
+            where = 0
+            for d in digits:
+                where |= places[d]
+            if bin(where).count("1") != n:
+                continue
+            keep = 0
+            for d in digits:
+                keep |= 1 << d
+            cells = [unit[k] for k in range(size) if where >> k & 1]
+            removed = board.removals(cells, board.layout.all & ~keep)
+            if removed:
+                return Move(name, eliminations=removed, reason="{} only fit in {} within {}".format(
+                    digits_text(keep), ", ".join(cell_name(i, size) for i in cells), unit_name(u, size)))
+    return None
+
+
+# Function to find a fish of n lines: a digit whose candidates in n rows (or
+# columns) lie in only n columns (rows). Those columns (rows) can't hold the
+# digit anywhere else.
+def fish(board, n, name):
+    layout, size = board.layout, board.size
+    for base, cover in ((0, size), (size, 0)):
+        for d in range(size):
+            bit = 1 << d
+            lines = {}
+            for k in range(size):
+                mask = board.positions(layout.units[base + k], bit)
+                if 2 <= bin(mask).count("1") <= n:
+                    lines[k] = mask
+            for group in itertools.combinations(sorted(lines), n):
+                where = 0
+                for k in group:
+                    where |= lines[k]
+                if bin(where).count("1") != n:
+                    continue
+                covers = [c for c in range(size) if where >> c & 1]
+                others = [i for c in covers for k, i in enumerate(layout.units[cover + c]) if k not in group]
+                removed = board.removals(others, bit)
+                if removed:
+                    return Move(name, eliminations=removed, reason="{} in {} is confined to {}".format(
+                        d + 1, " and ".join(unit_name(base + k, size) for k in group),
+                        " and ".join(unit_name(cover + c, size) for c in covers)))
+    return None
+
+
+# The techniques in order of cost, as (name, level, function)
+TECHNIQUES = [
+    ("naked single", "easy", naked_single),
+    ("hidden single", "easy", hidden_single),
+    ("pointing", "medium", pointing),
+    ("box-line reduction", "medium", box_line),
+    ("naked pair", "medium", lambda board: naked_subset(board, 2, "naked pair")),
+    ("hidden pair", "medium", lambda board: hidden_subset(board, 2, "hidden pair")),
+    ("naked triple", "medium", lambda board: naked_subset(board, 3, "naked triple")),
+    ("hidden triple", "medium", lambda board: hidden_subset(board, 3, "hidden triple")),
+    ("X-Wing", "hard", lambda board: fish(board, 2, "X-Wing")),
+    ("Swordfish", "hard", lambda board: fish(board, 3, "Swordfish")),
+]
+LEVEL_OF = {name: level for name, level, _ in TECHNIQUES}
+
+
+# Function to find the next logical move on a board, None if there is none.
+# eliminated holds (cell, value) candidates removed by earlier hints.
+def hint(board, eliminated=()):
+    return LogicBoard(board, eliminated).next_move()
+
+
+# Function to rate a puzzle by the hardest technique needed to solve it.
+# Returns (level, technique), technique being None when no move was needed
+# or the techniques got stuck.
+def rate(board):
+    logic = LogicBoard(board)
+    if logic.broken():
+        return "expert", None
+    hardest = None
+    while not logic.solved():
+        move = logic.next_move()
+        if move is None:
+            return "expert", None
+        if hardest is None or LEVELS.index(LEVEL_OF[move.technique]) > LEVELS.index(LEVEL_OF[hardest]):
+            hardest = move.technique
+        logic.apply(move)
+    return (LEVEL_OF[hardest] if hardest else "easy"), hardest
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) != 1:
+        sys.stderr.write("usage: python hints.py PUZZLE\n")
+        return 2
+    board = parse_puzzle(argv[0])
+    if board is None:
+        sys.stderr.write("Not a puzzle: {}\n".format(argv[0]))
+        return 2
+    logic = LogicBoard(board)
+    while not logic.solved():
+        move = logic.next_move()
+        if move is None:
+            print("stuck: needs guessing")
+            break
+        print("{}: {}".format(move.technique, move.reason))
+        logic.apply(move)
+    print("rating: {} ({})".format(*rate(board)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
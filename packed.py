@@ -0,0 +1,254 @@
+# Packed binary puzzle files.
+#
+# A packed file stores 9x9 puzzles with 4 bits per cell, two cells per byte
+# (high nibble first), so every puzzle takes 41 bytes instead of an 82-byte
+# text line or a few kilobytes as a list of lists. The file starts with a
+# 16-byte header:
+#
+#   magic        4 bytes  b"SDKP"
+#   version      1 byte   1
+#   size         1 byte   board size, 9
+#   record size  2 bytes  bytes per puzzle, 41
+#   count        8 bytes  number of puzzles
+#
+# (all little-endian) followed by the records back to back. Records have a
+# fixed size, so the index of puzzle i is simply HEADER.size + i * RECORD.
+# PuzzleFile memory-maps a file and hands out zero-copy NumPy views of the
+# records, or decodes single puzzles on demand, so any puzzle can be read by
+# index without loading the file into memory.
+#
+# Usage:
+#   python packed.py pack puzzles.txt puzzles.sdk
+#   python packed.py unpack puzzles.sdk > puzzles.txt
+#   python packed.py info puzzles.sdk
+
+import argparse
+import itertools
+import mmap
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b"SDKP"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHQ")
+# Bytes per packed 9x9 puzzle
+RECORD = 41
+# Lines converted at once by the text converters
+BLOCK = 65536
+
+
+# Function to unpack RECORD bytes into a 9x9 list board
+def unpack(record):
+    values = []
+    for byte in record:
+        values.append(byte >> 4)
+        values.append(byte & 15)
+    return [values[r * 9:r * 9 + 9] for r in range(9)]
+
+
+# Function to pack a stack of boards shaped (N, 9, 9) into records shaped (N, RECORD)
+def pack_boards(boards):
+    cells = np.zeros((len(boards), 2 * RECORD), dtype=np.uint8)
+    cells[:, :81] = np.asarray(boards, dtype=np.uint8).reshape(-1, 81)
+    return cells[:, 0::2] << 4 | cells[:, 1::2]
+
+
+# Function to unpack records shaped (N, RECORD) into boards shaped (N, 9, 9)
+def unpack_boards(records):
+    records = np.asarray(records, dtype=np.uint8).reshape(-1, RECORD)
+    cells = np.empty((len(records), 2 * RECORD), dtype=np.uint8)
+    cells[:, 0::2] = records >> 4
+    cells[:, 1::2] = records & 15
+    return cells[:, :81].reshape(-1, 9, 9)
+
+
+# Function to write an iterable of 9x9 boards to a packed file and return the
+# number of puzzles written
+def write_packed(path, boards):
+    boards = iter(boards)
+
+    def blocks():
+        while True:
+            block = list(itertools.islice(boards, BLOCK))
+            if not block:
+                return
+            yield pack_boards(block)
+
+    return write_blocks(path, blocks())
+
+
+# Function to write blocks of records shaped (N, RECORD) to a packed file and
+# return the number of puzzles written
+def write_blocks(path, blocks):
+    count = 0
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, 9, RECORD, 0))
+        for block in blocks:
+            f.write(np.ascontiguousarray(block, dtype=np.uint8).tobytes())
+            count += len(block)
+        # The count is only known at the end
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, 9, RECORD, count))
+    return count
+
+
+# Function to check if a file starts with the packed format's magic bytes
+def is_packed(path):
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+# A memory-mapped packed file. Puzzles are decoded only when they are read.
+class PuzzleFile:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("{} is too short to be a packed puzzle file".format(path))
+        magic, version, size, record, count = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or size != 9 or record != RECORD:
+            raise ValueError("{} is not a packed puzzle file".format(path))
+        if len(self.map) < HEADER.size + count * RECORD:
+            raise ValueError("{} is truncated".format(path))
+        self.count = count
+        # Zero-copy view of all records, shaped (count, RECORD)
+        self.records = np.frombuffer(self.map, dtype=np.uint8, count=count * RECORD,
+                                     offset=HEADER.size).reshape(count, RECORD)
+
+    def __len__(self):
+        return self.count
+
+    # Returns puzzle i as a new 9x9 list board
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError("puzzle index out of range")
+        start = HEADER.size + i * RECORD
+        return unpack(self.map[start:start + RECORD])
+
+    # Yields the puzzles one by one as 9x9 list boards
+    def __iter__(self):
+        for i in range(self.count):
+            yield self[i]
+
+    # Returns puzzles start..stop-1 decoded into a new (N, 9, 9) uint8 array
+    def boards(self, start=0, stop=None):
+        return unpack_boards(self.records[start:stop])
+
+    # Returns puzzle i as an 81-character line
+    def line(self, i):
+        return "".join(str(value) for row in self[i] for value in row)
+
+    def close(self):
+        # The records view has to go before the map can be closed
+        self.records = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Packed files opened by this process, used by Span
+_open_files = {}
+
+
+# Function to open a packed file once per process and reuse it afterwards
+def open_packed(path):
+    if path not in _open_files:
+        _open_files[path] = PuzzleFile(path)
+    return _open_files[path]
+
+
+# A range of puzzles in a packed file. Only the path and the bounds are
+# pickled, so it is cheap to send to a worker process, which maps the file
+# itself.
+class Span:
+    def __init__(self, path, start, stop):
+        self.path = path
+        self.start = start
+        self.stop = stop
+
+    # Returns the puzzles as (line number, 81-character line) pairs, numbered from 1
+    def lines(self):
+        puzzles = open_packed(self.path)
+        return [(i + 1, puzzles.line(i)) for i in range(self.start, self.stop)]
+
+
+# Function to split a packed file into Spans of chunk_size puzzles
+def read_spans(path, chunk_size):
+    with PuzzleFile(path) as puzzles:
+        count = len(puzzles)
+    for start in range(0, count, chunk_size):
+        yield Span(path, start, min(start + chunk_size, count))
+
+
+# Function to turn 81-character text lines into blocks of records. Lines that
+# are not valid puzzles are skipped and counted in skipped[0].
+def text_to_blocks(lines, skipped):
+    lines = iter(lines)
+    while True:
+        block = list(itertools.islice(lines, BLOCK))
+        if not block:
+            return
+        block = [line.strip() for line in block if line.strip()]
+        good = [line for line in block if len(line) == 81 and line.isascii()]
+        cells = np.frombuffer("".join(good).encode("ascii"), dtype=np.uint8).reshape(-1, 81).copy()
+        cells[cells == ord(".")] = ord("0")
+        cells -= ord("0")
+        ok = (cells <= 9).all(axis=1)
+        skipped[0] += len(block) - int(ok.sum())
+        yield pack_boards(cells[ok])
+
+
+# Function to turn a packed file into 81-character lines written to out
+def write_text(puzzles, out):
+    for start in range(0, len(puzzles), BLOCK):
+        cells = puzzles.boards(start, start + BLOCK).reshape(-1, 81) + ord("0")
+        text = np.hstack([cells, np.full((len(cells), 1), ord("\n"), dtype=np.uint8)])
+        out.write(text.tobytes().decode("ascii"))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert 9x9 puzzles between 81-character text lines and packed files.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_cmd = commands.add_parser("pack", help="text lines to a packed file")
+    pack_cmd.add_argument("input", help="text file, '-' for stdin")
+    pack_cmd.add_argument("output", help="packed file to write")
+    unpack_cmd = commands.add_parser("unpack", help="packed file to text lines")
+    unpack_cmd.add_argument("input", help="packed file")
+    unpack_cmd.add_argument("output", nargs="?", default="-", help="text file to write, '-' for stdout (default)")
+    info_cmd = commands.add_parser("info", help="show the number of puzzles in a packed file")
+    info_cmd.add_argument("input", help="packed file")
+    args = parser.parse_args(argv)
+
+    if args.command == "pack":
+        stream = sys.stdin if args.input == "-" else open(args.input)
+        skipped = [0]
+        try:
+            count = write_blocks(args.output, text_to_blocks(stream, skipped))
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        sys.stderr.write("Packed {} puzzles, skipped {} invalid lines\n".format(count, skipped[0]))
+    elif args.command == "unpack":
+        with PuzzleFile(args.input) as puzzles:
+            if args.output == "-":
+                write_text(puzzles, sys.stdout)
+            else:
+                with open(args.output, "w") as out:
+                    write_text(puzzles, out)
+    else:
+        with PuzzleFile(args.input) as puzzles:
+            print("{}: {} puzzles, {} bytes each".format(args.input, len(puzzles), RECORD))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,323 @@
+# Parallel search for a single hard puzzle.
+#
+# The top of the search tree is expanded level by level (with the engine's
+# propagation at every node) until there are enough subproblems to keep every
+# worker busy. Each expanded node is replaced by its children in place, so the
+# subproblems stay in the order the serial depth-first search would visit
+# them and the leftmost ones, where it would look first, are taken first. The
+# subproblems go into a shared queue that a set of worker processes take them
+# from. A single worker gets the whole tree, so `--jobs 1` searches exactly
+# the nodes the serial engine does. Each worker searches its subproblem depth-first
+# with an explicit stack, so when another worker runs out of work it can give
+# away the untried branches of its shallowest open node, the biggest pieces of
+# work it has (work stealing, with the busy worker handing the work over).
+#
+# In solve mode the first worker that finds a solution stops everyone. In
+# count mode the workers count every solution of their subproblems and add
+# them up in a shared counter, stopping early once `limit` is reached.
+#
+# Usage:
+#   python parallel.py PUZZLE              # solve
+#   python parallel.py PUZZLE --count      # count all solutions
+#   python parallel.py PUZZLE --count --limit 1000000 --jobs 8
+
+import argparse
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from core import parse_puzzle, format_puzzle
+from solver import Engine
+
+# Subproblems per worker made by the initial split
+TASKS_PER_JOB = 8
+# Nodes searched between two checks for cancellation and hungry workers
+CHECK_EVERY = 256
+# Seconds an idle worker waits for a task before checking again
+IDLE_WAIT = 0.01
+
+# Slots of the shared counters
+OUTSTANDING = 0  # Subproblems queued or being searched
+QUEUED = 1  # Subproblems waiting in the queue
+IDLE = 2  # Workers waiting for a subproblem
+FOUND = 3  # Solutions counted so far
+
+
+# Function to build an engine from a flat sequence of cells
+def engine_from_cells(cells, size):
+    return Engine([cells[r * size:(r + 1) * size] for r in range(size)])
+
+
+# Function to expand the search tree until there are at least `target` open
+# subproblems or the tree is exhausted. Every pass replaces the open nodes,
+# leftmost first, with their children, so the subproblems stay in depth-first
+# order. Subproblems are board snapshots (bytes). Returns (subproblems,
+# solutions found on the way, nodes expanded). In solve mode (stop_at_first)
+# it returns as soon as one solution is found.
+def split(engine, target, stop_at_first):
+    size = engine.size
+    digit_of = engine.layout.digit_of
+    frontier = [bytes(engine.cells)]
+    solutions = []
+    nodes = 0
+    while frontier and len(frontier) < target:
+        expanded = []
+        for k, snapshot in enumerate(frontier):
+            # Enough subproblems already: keep the rest of the pass as it is
+            if len(expanded) + len(frontier) - k >= target:
+                expanded.extend(frontier[k:])
+                break
+            node = engine_from_cells(snapshot, size)
+            i = node.propagate([])
+            nodes += 1
+            if i == -1:
+                solutions.append(bytes(node.cells))
+                if stop_at_first:
+                    return expanded + frontier[k + 1:], solutions, nodes
+            elif i is not None:
+                cand = node.candidates(i)
+                while cand:
+                    bit = cand & -cand
+                    cand ^= bit
+                    node.assign(i, digit_of[bit])
+                    expanded.append(bytes(node.cells))
+                    node.unassign(i)
+        frontier = expanded
+    return frontier, solutions, nodes
+
+
+# Shared state of one parallel search
+class Shared:
+    def __init__(self, context, counting, limit):
+        self.tasks = context.Queue()
+        self.results = context.Queue()
+        self.stop = context.Event()
+        self.counters = context.Array("q", 4)
+        self.counting = counting
+        self.limit = limit
+
+    # Adds delta to a counter and returns its new value
+    def add(self, slot, delta):
+        with self.counters.get_lock():
+            self.counters[slot] += delta
+            return self.counters[slot]
+
+    # Reads a counter without taking the lock, for polling
+    def peek(self, slot):
+        return self.counters.get_obj()[slot]
+
+    # Queues subproblems
+    def give(self, snapshots):
+        self.add(OUTSTANDING, len(snapshots))
+        self.add(QUEUED, len(snapshots))
+        for snapshot in snapshots:
+            self.tasks.put(snapshot)
+
+
+# Function to search one subproblem depth-first. Returns (solution or None,
+# solutions counted, nodes). Untried branches of the shallowest open node are
+# handed to the queue whenever a worker is idle and the queue is empty.
+def search_task(engine, shared):
+    digit_of = engine.layout.digit_of
+    counting, limit = shared.counting, shared.limit
+    found = nodes = 0
+    # Open nodes as [cell, untried candidates, propagation trail, board snapshot]
+    frames = []
+    trail = []
+    i = engine.propagate(trail)
+    while True:
+        nodes += 1
+        if i == -1:
+            if not counting:
+                return bytes(engine.cells), found, nodes
+            found += 1
+            engine.undo(trail)
+        elif i is None:
+            engine.undo(trail)
+        else:
+            frames.append([i, engine.candidates(i), trail, bytes(engine.cells)])
+
+        if nodes % CHECK_EVERY == 0:
+            if shared.stop.is_set():
+                return None, found, nodes
+            if counting and limit and found:
+                if shared.add(FOUND, found) >= limit:
+                    shared.stop.set()
+                    return None, 0, nodes
+                found = 0
+            if shared.peek(IDLE) and not shared.peek(QUEUED):
+                donate(frames, shared, digit_of)
+
+        # Next untried branch, backtracking out of exhausted nodes
+        while frames:
+            frame = frames[-1]
+            cell, cand = frame[0], frame[1]
+            if engine.cells[cell]:
+                engine.unassign(cell)
+            if cand:
+                bit = cand & -cand
+                frame[1] = cand ^ bit
+                engine.assign(cell, digit_of[bit])
+                break
+            frames.pop()
+            engine.undo(frame[2])
+        else:
+            return None, found, nodes
+        trail = []
+        i = engine.propagate(trail)
+
+
+# Function to hand the untried branches of the shallowest open node to the queue
+def donate(frames, shared, digit_of):
+    for frame in frames:
+        cell, cand, _, snapshot = frame
+        if cand:
+            given = []
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                cells = bytearray(snapshot)
+                cells[cell] = digit_of[bit]
+                given.append(bytes(cells))
+            frame[1] = 0
+            shared.give(given)
+            return
+
+
+# Worker process: takes subproblems from the queue until the search is over,
+# then reports (solution or None, nodes searched) once
+def worker(shared, size):
+    solution = None
+    nodes = 0
+    idle = False
+    try:
+        while not shared.stop.is_set():
+            try:
+                snapshot = shared.tasks.get(timeout=IDLE_WAIT)
+            except queue.Empty:
+                if not idle:
+                    shared.add(IDLE, 1)
+                    idle = True
+                continue
+            if idle:
+                shared.add(IDLE, -1)
+                idle = False
+            shared.add(QUEUED, -1)
+            engine = engine_from_cells(snapshot, size)
+            result, count, searched = search_task(engine, shared) if engine.consistent else (None, 0, 1)
+            nodes += searched
+            if count and shared.add(FOUND, count) >= (shared.limit or float("inf")):
+                shared.stop.set()
+            if result is not None:
+                solution = result
+                shared.stop.set()
+            # The worker that finishes the last subproblem ends the search
+            if shared.add(OUTSTANDING, -1) == 0:
+                shared.stop.set()
+    finally:
+        # A failing worker still reports, so the search never waits on it forever
+        if sys.exc_info()[0] is not None:
+            shared.stop.set()
+        # The search is over, so donations still waiting to be written to the
+        # task queue are not needed: don't let them keep the worker from exiting
+        shared.tasks.cancel_join_thread()
+        shared.results.put((solution, nodes))
+
+
+# Function to empty the task queue once the workers are gone. Subproblems left
+# in it would otherwise keep the queue's feeder thread blocked on a full pipe,
+# and the interpreter waits for that thread when it exits.
+def drain(tasks):
+    try:
+        while True:
+            tasks.get(timeout=IDLE_WAIT)
+    except queue.Empty:
+        pass
+    tasks.cancel_join_thread()
+    tasks.close()
+
+
+# Function to run a parallel search on a board. Returns (solution cells or
+# None, number of solutions counted, nodes searched).
+def run(board, jobs=None, counting=False, limit=None):
+    jobs = jobs or os.cpu_count() or 1
+    engine = Engine(board)
+    if not engine.consistent:
+        return None, 0, 0
+    tasks, solutions, split_nodes = split(engine, jobs * TASKS_PER_JOB if jobs > 1 else 1, not counting)
+    if not counting and solutions:
+        return solutions[0], 1, split_nodes
+    found = len(solutions)
+    if not tasks or (limit and found >= limit):
+        return (solutions[0] if solutions else None), (min(found, limit) if limit else found), split_nodes
+
+    context = multiprocessing.get_context()
+    shared = Shared(context, counting, limit and limit - found)
+    shared.give(tasks)
+    workers = [context.Process(target=worker, args=(shared, engine.size), daemon=True) for _ in range(jobs)]
+    for process in workers:
+        process.start()
+    solution, nodes = None, split_nodes
+    for _ in workers:
+        result, searched = shared.results.get()
+        nodes += searched
+        if result is not None and solution is None:
+            solution = result
+    for process in workers:
+        process.join()
+    drain(shared.tasks)
+    found += shared.counters[FOUND]
+    if limit:
+        found = min(found, limit)
+    if solution is None and solutions:
+        solution = solutions[0]
+    return solution, found if counting else int(solution is not None), nodes
+
+
+# Function to solve the board in place with a parallel search. Returns True
+# if a solution was found.
+def solve(board, jobs=None):
+    solution, _, _ = run(board, jobs)
+    if solution is None:
+        return False
+    size = len(board)
+    for i, value in enumerate(solution):
+        board[i // size][i % size] = value
+    return True
+
+
+# Function to count the solutions of a board with a parallel search, all of
+# them or up to limit
+def count_solutions(board, limit=None, jobs=None):
+    return run(board, jobs, counting=True, limit=limit)[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve or count the solutions of one puzzle on all cores.")
+    parser.add_argument("puzzle", help="puzzle line (81, 256 or 625 characters)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--count", action="store_true", help="count the solutions instead of finding one")
+    parser.add_argument("--limit", type=int, help="stop counting at this many solutions")
+    args = parser.parse_args(argv)
+    board = parse_puzzle(args.puzzle)
+    if board is None:
+        parser.error("not a puzzle line")
+
+    start = time.perf_counter()
+    solution, found, nodes = run(board, args.jobs, args.count, args.limit)
+    elapsed = time.perf_counter() - start
+    if args.count:
+        print(found)
+    elif solution is None:
+        print("unsolvable")
+    else:
+        size = len(board)
+        print(format_puzzle([list(solution[r * size:(r + 1) * size]) for r in range(size)]))
+    sys.stderr.write("{} nodes in {:.3f} s on {} workers\n".format(nodes, elapsed, args.jobs))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
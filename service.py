@@ -0,0 +1,329 @@
+# Local solving service.
+#
+# A small asyncio HTTP/JSON server, on a TCP port or a Unix socket, that
+# solves puzzles for other processes on the same host. Puzzles of concurrent
+# requests are collected into micro-batches (up to --max-batch puzzles, or
+# whatever arrived within --max-delay-ms of the first one) and solved on a
+# process pool, so the event loop itself never runs the solver. Every puzzle
+# has a time limit: the worker gives up on it once the limit has passed, and
+# the request answers "timeout" for every puzzle not finished in time.
+#
+# Endpoints:
+#   POST /solve    {"puzzle": "<81 chars>"}  or  {"puzzles": ["...", ...]},
+#                  optionally with "timeout" in seconds
+#   GET  /metrics  request, puzzle and batch counters, throughput, queue depth
+#   GET  /health   {"status": "ok"}
+#
+# Usage:
+#   python service.py --port 8081
+#   python service.py --unix /tmp/sudoku.sock
+#   curl -s localhost:8081/solve -d '{"puzzle": "0700000430400096108006349000940520003584600200008005300800700919021000050070408020"}'
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from batch import INVALID, UNSOLVABLE
+from core import parse_puzzle, format_puzzle
+from solver import BRANCH, SolveStats, solve
+
+# Result of a puzzle that ran out of time
+TIMEOUT = "timeout"
+SOLVED = "solved"
+# Defaults of the command line options
+MAX_BATCH = 64
+MAX_DELAY = 0.005
+TIMEOUT_SECONDS = 5.0
+# Largest time limit a request may ask for
+MAX_TIMEOUT = 60.0
+# Largest request body accepted, in bytes
+MAX_BODY = 16 * 1024 * 1024
+# Completed puzzles remembered for the recent throughput and latency figures
+RECENT = 1000
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+# Raised inside a worker when a puzzle runs out of time
+class SolveTimeout(Exception):
+    pass
+
+
+# Function to build a SolveStats hook that stops the search at the wall-clock
+# time `deadline`. The clock is only read when the search branches.
+def deadline_hook(deadline):
+    def hook(event, cell, value, depth):
+        if event == BRANCH and time.time() > deadline:
+            raise SolveTimeout()
+
+    return hook
+
+
+# Worker function: solves (line, deadline) pairs and returns a (status,
+# solution line) pair for each. Deadlines are wall-clock times, so puzzles
+# whose request has already given up are not started at all.
+def solve_items(items):
+    results = []
+    for line, deadline in items:
+        board = parse_puzzle(line)
+        if board is None:
+            results.append((INVALID, None))
+            continue
+        if time.time() > deadline:
+            results.append((TIMEOUT, None))
+            continue
+        try:
+            solved = solve(board, SolveStats([deadline_hook(deadline)]))
+        except SolveTimeout:
+            results.append((TIMEOUT, None))
+            continue
+        results.append((SOLVED, format_puzzle(board)) if solved else (UNSOLVABLE, None))
+    return results
+
+
+# Collects puzzles from concurrent requests into micro-batches and runs them
+# on a process pool
+class Batcher:
+    def __init__(self, pool, jobs, max_batch=MAX_BATCH, max_delay=MAX_DELAY):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = asyncio.Queue()
+        # Batches handed to the pool at once, two per worker keep them all busy
+        self.slots = asyncio.Semaphore(2 * jobs)
+        self.in_flight = 0
+        # Running dispatch tasks; the event loop only keeps weak references to tasks
+        self.tasks = set()
+        self.started = time.time()
+        self.counts = {"requests": 0, "puzzles": 0, "batches": 0, SOLVED: 0, UNSOLVABLE: 0, INVALID: 0, TIMEOUT: 0}
+        self.batched = 0
+        # (finish time, latency) of recently completed puzzles
+        self.recent = deque(maxlen=RECENT)
+
+    # Queues a puzzle line and returns a future for its (status, solution) pair
+    def submit(self, line, deadline):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((line, deadline, future, time.time()))
+        return future
+
+    # Background task: forms batches from the queue and dispatches them
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                if self.queue.empty():
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    batch.append(self.queue.get_nowait())
+            await self.slots.acquire()
+            task = loop.create_task(self.dispatch(batch))
+            self.tasks.add(task)
+            task.add_done_callback(self.tasks.discard)
+
+    # Solves one batch on the pool and resolves its futures
+    async def dispatch(self, batch):
+        try:
+            # Puzzles whose request already gave up are skipped
+            batch = [item for item in batch if not item[2].done()]
+            if not batch:
+                return
+            self.in_flight += 1
+            self.counts["batches"] += 1
+            self.batched += len(batch)
+            try:
+                results = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, solve_items, [(line, deadline) for line, deadline, _, _ in batch])
+            except Exception as error:
+                for _, _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+            finally:
+                self.in_flight -= 1
+            now = time.time()
+            for (_, _, future, queued), result in zip(batch, results):
+                self.recent.append((now, now - queued))
+                if not future.done():
+                    future.set_result(result)
+        finally:
+            self.slots.release()
+
+    # Solves a list of puzzle lines within `seconds` and returns a result dict for each
+    async def solve_all(self, lines, seconds):
+        self.counts["requests"] += 1
+        self.counts["puzzles"] += len(lines)
+        if not lines:
+            return []
+        deadline = time.time() + seconds
+        futures = [self.submit(line, deadline) for line in lines]
+        await asyncio.wait(futures, timeout=seconds)
+        answers = []
+        for future in futures:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                status, solution = future.result()
+            else:
+                future.cancel()
+                status, solution = TIMEOUT, None
+            self.counts[status] += 1
+            answers.append({"status": status, "solution": solution} if solution else {"status": status})
+        return answers
+
+    # Returns the service metrics as a dict
+    def metrics(self):
+        now = time.time()
+        uptime = now - self.started
+        recent = [latency for finished, latency in self.recent if now - finished <= 10]
+        recent.sort()
+        answered = sum(self.counts[status] for status in (SOLVED, UNSOLVABLE, INVALID, TIMEOUT))
+        return dict(self.counts, **{
+            "uptime_sec": round(uptime, 1),
+            "queue_depth": self.queue.qsize(),
+            "batches_in_flight": self.in_flight,
+            "avg_batch_size": round(self.batched / self.counts["batches"], 1) if self.counts["batches"] else 0.0,
+            "puzzles_per_sec": round(answered / uptime, 2) if uptime else 0.0,
+            "recent_puzzles_per_sec": round(len(recent) / 10, 2),
+            "recent_latency_ms": {
+                "p50": round(recent[len(recent) // 2] * 1000, 3) if recent else 0.0,
+                "p99": round(recent[min(len(recent) - 1, len(recent) * 99 // 100)] * 1000, 3) if recent else 0.0,
+            },
+        })
+
+
+# Function to write an HTTP response with a JSON body
+async def respond(writer, status, data, keep_alive):
+    body = json.dumps(data).encode()
+    head = "HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\nConnection: {}\r\n\r\n".format(
+        status, REASONS[status], len(body), "keep-alive" if keep_alive else "close")
+    writer.write(head.encode("ascii") + body)
+    await writer.drain()
+
+
+# Function to handle one POST /solve body. Returns (HTTP status, response data).
+async def handle_solve(batcher, body, default_timeout):
+    try:
+        request = json.loads(body or b"{}")
+        seconds = min(float(request.get("timeout", default_timeout)), MAX_TIMEOUT)
+    except (ValueError, TypeError, AttributeError):
+        return 400, {"error": "body must be a JSON object"}
+    if not (math.isfinite(seconds) and seconds > 0):
+        return 400, {"error": "'timeout' must be a positive number of seconds"}
+    if isinstance(request.get("puzzle"), str):
+        return 200, (await batcher.solve_all([request["puzzle"]], seconds))[0]
+    puzzles = request.get("puzzles")
+    if isinstance(puzzles, list) and all(isinstance(line, str) for line in puzzles):
+        return 200, {"results": await batcher.solve_all(puzzles, seconds)}
+    return 400, {"error": "expected 'puzzle' (a string) or 'puzzles' (a list of strings)"}
+
+
+# Function to serve the HTTP requests of one connection
+async def handle_connection(batcher, default_timeout, reader, writer):
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            parts = request_line.decode("latin-1").split()
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                headers[name.strip().lower()] = value.strip()
+            if len(parts) != 3:
+                await respond(writer, 400, {"error": "malformed request line"}, False)
+                break
+            method, path, version = parts
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            length = int(headers.get("content-length") or 0)
+            if length > MAX_BODY:
+                await respond(writer, 413, {"error": "request body too large"}, False)
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            path = path.split("?")[0]
+            if path == "/solve":
+                if method != "POST":
+                    status, data = 405, {"error": "use POST"}
+                else:
+                    status, data = await handle_solve(batcher, body, default_timeout)
+            elif path == "/metrics":
+                status, data = 200, batcher.metrics()
+            elif path == "/health":
+                status, data = 200, {"status": "ok"}
+            else:
+                status, data = 404, {"error": "unknown path"}
+            await respond(writer, status, data, keep_alive)
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+# Function to start the pool, the batcher and the server, and serve until cancelled
+async def serve(host="127.0.0.1", port=8081, unix=None, jobs=None, max_batch=MAX_BATCH,
+                max_delay=MAX_DELAY, timeout=TIMEOUT_SECONDS, ready=None):
+    jobs = jobs or os.cpu_count() or 1
+    with ProcessPoolExecutor(jobs) as pool:
+        batcher = Batcher(pool, jobs, max_batch, max_delay)
+        batching = asyncio.get_running_loop().create_task(batcher.run())
+
+        async def handler(reader, writer):
+            await handle_connection(batcher, timeout, reader, writer)
+
+        if unix:
+            server = await asyncio.start_unix_server(handler, unix)
+        else:
+            server = await asyncio.start_server(handler, host, port)
+        if ready is not None:
+            ready(server)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batching.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the Sudoku solver over local HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8081, help="TCP port to listen on (default: 8081)")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of a TCP port")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="number of worker processes")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="largest number of puzzles in a batch")
+    parser.add_argument("--max-delay-ms", type=float, default=MAX_DELAY * 1000,
+                        help="how long a batch waits for more puzzles, in milliseconds")
+    parser.add_argument("--timeout", type=float, default=TIMEOUT_SECONDS,
+                        help="default time limit per request, in seconds")
+    args = parser.parse_args(argv)
+
+    def ready(server):
+        where = args.unix or "http://{}:{}".format(args.host, args.port)
+        sys.stderr.write("Serving on {}\n".format(where))
+
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.jobs, args.max_batch,
+                          args.max_delay_ms / 1000, args.timeout, ready))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
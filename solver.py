@@ -0,0 +1,493 @@
+# Bitmask constraint-propagation solver engine.
+#
+# The board is kept as a flat list of cells together with one "used digits"
+# bitmask per row, column and box. Any size x size board with square boxes
+# works (9x9, 16x16, 25x25, ...); the index tables of each size are built once
+# and shared (see Layout). Bit (d - 1) is set in a mask when digit d is
+# already placed in that unit, so the candidates of a cell are simply the digits
+# missing from its row, column and box. The search always branches on the cell
+# with the fewest candidates (MRV), propagates naked and hidden singles after
+# every guess and undoes its own placements from a trail instead of rescanning
+# or copying the board.
+#
+# A SolveStats object can be attached to an engine to record what the search
+# does (see below). Without one the search only pays for an `is None` check per
+# node.
+
+import time
+
+# Kinds of events yielded by Engine.steps() and passed to SolveStats hooks
+ASSIGN = "assign"
+BACKTRACK = "backtrack"
+# Hooks only: the search is about to branch on a cell, value is its number of candidates
+BRANCH = "branch"
+
+
+# Number of set bits in masks too wide for a full lookup table, counted
+# 13 bits at a time
+class SplitPopcount:
+    def __init__(self):
+        self.low = [bin(m).count("1") for m in range(1 << 13)]
+
+    def __getitem__(self, mask):
+        return self.low[mask & 0x1FFF] + self.low[mask >> 13]
+
+
+# Index tables of one board size. A board has size x size cells split into
+# box x box boxes, size being box squared (9, 16, 25, ...).
+class Layout:
+    def __init__(self, box):
+        self.box = box
+        self.size = size = box * box
+        self.cells = cells = size * size
+        # Bitmask with one bit per digit
+        self.all = (1 << size) - 1
+
+        # Row, column and box index of every cell
+        self.row_of = [i // size for i in range(cells)]
+        self.col_of = [i % size for i in range(cells)]
+        self.box_of = [(i // size) // box * box + (i % size) // box for i in range(cells)]
+
+        # The 3 * size units (rows, columns, boxes) as lists of cell indexes
+        self.units = ([[r * size + c for c in range(size)] for r in range(size)] +
+                      [[r * size + c for r in range(size)] for c in range(size)] +
+                      [[i for i in range(cells) if self.box_of[i] == b] for b in range(size)])
+
+        # Lookup tables: number of candidates in a mask and digit of a single bit
+        if size <= 16:
+            self.popcount = [bin(m).count("1") for m in range(self.all + 1)]
+        else:
+            self.popcount = SplitPopcount()
+        self.digit_of = {1 << d: d + 1 for d in range(size)}
+
+
+# Layouts that were already built, keyed by board size
+LAYOUTS = {}
+
+
+# Function to get the layout of a size x size board, building it on first use.
+# Raises ValueError if size is not a square number.
+def get_layout(size=9):
+    if size not in LAYOUTS:
+        box = int(round(size ** 0.5))
+        if size < 1 or box * box != size:
+            raise ValueError("Board size must be a square number like 9, 16 or 25, not {}".format(size))
+        LAYOUTS[size] = Layout(box)
+    return LAYOUTS[size]
+
+
+# Tables of the classic 9x9 board
+CLASSIC = get_layout(9)
+SIZE = CLASSIC.size
+BOX = CLASSIC.box
+CELLS = CLASSIC.cells
+ALL = CLASSIC.all
+ROW_OF = CLASSIC.row_of
+COL_OF = CLASSIC.col_of
+BOX_OF = CLASSIC.box_of
+UNITS = CLASSIC.units
+POPCOUNT = CLASSIC.popcount
+DIGIT_OF = CLASSIC.digit_of
+
+
+class Engine:
+    # Loads a square board (list of lists or numpy array, 0 for empty cells).
+    # Its size (9, 16, 25, ...) is taken from the number of rows.
+    def __init__(self, board, stats=None):
+        self.layout = layout = get_layout(len(board))
+        self.size = layout.size
+        self.row_of, self.col_of, self.box_of = layout.row_of, layout.col_of, layout.box_of
+        self.cells = bytearray(layout.cells)
+        self.rows = [0] * layout.size
+        self.cols = [0] * layout.size
+        self.boxes = [0] * layout.size
+        # Number of empty cells left
+        self.empty = layout.cells
+        # False if two givens already clash
+        self.consistent = True
+        # Number of search nodes visited so far
+        self.nodes = 0
+        # Number of hidden singles placed by propagate() so far
+        self.hidden_singles = 0
+        # Optional SolveStats collector
+        self.stats = stats
+        row_of, col_of = self.row_of, self.col_of
+        for i in range(layout.cells):
+            value = int(board[row_of[i]][col_of[i]])
+            if value:
+                if not 0 < value <= layout.size:
+                    self.consistent = False
+                    continue
+                if not self.fits(i, value):
+                    self.consistent = False
+                self.assign(i, value)
+
+    # Bitmask of the digits that can still go into cell i
+    def candidates(self, i):
+        return self.layout.all & ~(self.rows[self.row_of[i]] | self.cols[self.col_of[i]] | self.boxes[self.box_of[i]])
+
+    # True if value can go into cell i without clashing with its row, column or box
+    def fits(self, i, value):
+        return bool(self.candidates(i) & (1 << (value - 1)))
+
+    # Places value into cell i and marks it as used in the cell's units
+    def assign(self, i, value):
+        bit = 1 << (value - 1)
+        self.cells[i] = value
+        self.empty -= 1
+        self.rows[self.row_of[i]] |= bit
+        self.cols[self.col_of[i]] |= bit
+        self.boxes[self.box_of[i]] |= bit
+
+    # Removes the value of cell i and frees it in the cell's units
+    def unassign(self, i):
+        bit = ~(1 << (self.cells[i] - 1))
+        self.cells[i] = 0
+        self.empty += 1
+        self.rows[self.row_of[i]] &= bit
+        self.cols[self.col_of[i]] &= bit
+        self.boxes[self.box_of[i]] &= bit
+
+    # Undoes every placement recorded in trail
+    def undo(self, trail):
+        for i in trail:
+            self.unassign(i)
+
+    # Fills in naked and hidden singles until nothing changes. Every placement is
+    # appended to trail so the caller can undo it. Returns None on a
+    # contradiction, -1 when the board is full, otherwise the empty cell with the
+    # fewest candidates.
+    def propagate(self, trail):
+        cells, rows, cols, boxes = self.cells, self.rows, self.cols, self.boxes
+        row_of, col_of, box_of = self.row_of, self.col_of, self.box_of
+        layout = self.layout
+        full, popcount, digit_of = layout.all, layout.popcount, layout.digit_of
+        while True:
+            best = -1
+            best_count = layout.size + 1
+            changed = False
+
+            # Naked singles: cells with exactly one candidate left
+            for i in range(layout.cells):
+                if cells[i]:
+                    continue
+                cand = full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                count = popcount[cand]
+                if count == 0:
+                    return None
+                if count == 1:
+                    self.assign(i, digit_of[cand])
+                    trail.append(i)
+                    changed = True
+                elif count < best_count:
+                    best = i
+                    best_count = count
+            if best == -1:
+                # A naked single may have emptied a neighbour, so check again
+                if changed:
+                    continue
+                return -1
+            if changed:
+                continue
+
+            # Hidden singles: digits that fit in only one cell of a unit
+            for unit in layout.units:
+                once = twice = used = 0
+                for i in unit:
+                    if cells[i]:
+                        used |= 1 << (cells[i] - 1)
+                        continue
+                    cand = full & ~(rows[row_of[i]] | cols[col_of[i]] | boxes[box_of[i]])
+                    twice |= once & cand
+                    once |= cand
+                # Some missing digit has no place left in this unit
+                if (once | used) != full:
+                    return None
+                hidden = once & ~twice
+                while hidden:
+                    bit = hidden & -hidden
+                    hidden ^= bit
+                    for i in unit:
+                        if not cells[i] and self.candidates(i) & bit:
+                            self.assign(i, digit_of[bit])
+                            trail.append(i)
+                            self.hidden_singles += 1
+                            changed = True
+                            break
+            if not changed:
+                return best
+
+    # Depth-first search over the most constrained cell
+    def search(self, depth=0):
+        self.nodes += 1
+        stats = self.stats
+        trail = []
+        i = self.propagate(trail) if stats is None else stats.propagate(self, trail, depth)
+        if i == -1:
+            return True
+        if i is not None:
+            cand = self.candidates(i)
+            digit_of = self.layout.digit_of
+            if stats is not None:
+                stats.branch(i, self.layout.popcount[cand], depth)
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                self.assign(i, digit_of[bit])
+                if stats is not None:
+                    stats.guess(i, digit_of[bit], depth)
+                if self.search(depth + 1):
+                    return True
+                self.unassign(i)
+                if stats is not None:
+                    stats.backtrack(i, depth)
+        self.undo(trail)
+        if stats is not None:
+            stats.undo(trail, depth)
+        return False
+
+    # Generator version of search() for visualizing it. Yields every change to
+    # the board as (ASSIGN, cell, value) or (BACKTRACK, cell, 0), in order, and
+    # returns True if the board was solved.
+    def steps(self, depth=0):
+        self.nodes += 1
+        stats = self.stats
+        trail = []
+        i = self.propagate(trail) if stats is None else stats.propagate(self, trail, depth)
+        for j in trail:
+            yield ASSIGN, j, self.cells[j]
+        if i == -1:
+            return True
+        if i is not None:
+            cand = self.candidates(i)
+            digit_of = self.layout.digit_of
+            if stats is not None:
+                stats.branch(i, self.layout.popcount[cand], depth)
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                self.assign(i, digit_of[bit])
+                if stats is not None:
+                    stats.guess(i, digit_of[bit], depth)
+                yield ASSIGN, i, digit_of[bit]
+                if (yield from self.steps(depth + 1)):
+                    return True
+                self.unassign(i)
+                if stats is not None:
+                    stats.backtrack(i, depth)
+                yield BACKTRACK, i, 0
+        self.undo(trail)
+        if stats is not None:
+            stats.undo(trail, depth)
+        for j in reversed(trail):
+            yield BACKTRACK, j, 0
+        return False
+
+    # Counts solutions up to limit. The cells of the first solution found are
+    # appended to first, unless first is None.
+    def count(self, limit, first=None):
+        self.nodes += 1
+        trail = []
+        found = 0
+        i = self.propagate(trail)
+        if i == -1:
+            if first is not None and not first:
+                first.extend(self.cells)
+            found = 1
+        elif i is not None:
+            cand = self.candidates(i)
+            digit_of = self.layout.digit_of
+            while cand and found < limit:
+                bit = cand & -cand
+                cand ^= bit
+                self.assign(i, digit_of[bit])
+                found += self.count(limit - found, first)
+                self.unassign(i)
+        self.undo(trail)
+        return found
+
+    # Generator over every solution, in the order search() would find them.
+    # Each solution is yielded as self.cells, the engine's own bytearray, so
+    # nothing is copied: it is only valid until the generator is resumed.
+    def solutions(self):
+        self.nodes += 1
+        trail = []
+        i = self.propagate(trail)
+        if i == -1:
+            yield self.cells
+        elif i is not None:
+            cand = self.candidates(i)
+            digit_of = self.layout.digit_of
+            while cand:
+                bit = cand & -cand
+                cand ^= bit
+                self.assign(i, digit_of[bit])
+                yield from self.solutions()
+                self.unassign(i)
+        self.undo(trail)
+
+    # Returns the board as a new list of lists
+    def to_rows(self):
+        size = self.size
+        return [list(self.cells[r * size:(r + 1) * size]) for r in range(size)]
+
+    # Copies the engine's cells back into a board of the same size
+    def write(self, board):
+        row_of, col_of = self.row_of, self.col_of
+        for i in range(self.layout.cells):
+            board[row_of[i]][col_of[i]] = self.cells[i]
+
+
+# Collects statistics about a search and passes its events on to hooks.
+#
+# Counters:
+#   nodes          - search nodes visited (one propagation each)
+#   assignments    - every digit placed, by propagation or by guessing
+#   guesses        - digits tried on a branching cell
+#   backtracks     - guesses that were taken back
+#   naked_singles  - cells filled because they had one candidate left
+#   hidden_singles - cells filled because a digit fit nowhere else in a unit
+#   max_depth      - deepest level of guesses reached
+#   branching      - {depth: {candidates of the branching cell: times}}
+#   times          - wall time in seconds of the "setup", "propagate" and
+#                    "search" phases ("search" excludes propagation)
+#
+# A hook is any callable taking (event, cell, value, depth), where event is
+# ASSIGN, BACKTRACK or BRANCH. Propagated cells are reported as ASSIGN events
+# too, and cells taken back when a node fails as BACKTRACK events.
+class SolveStats:
+    def __init__(self, hooks=()):
+        self.hooks = list(hooks)
+        self.nodes = 0
+        self.assignments = 0
+        self.guesses = 0
+        self.backtracks = 0
+        self.naked_singles = 0
+        self.hidden_singles = 0
+        self.max_depth = 0
+        self.branching = {}
+        self.times = {"setup": 0.0, "propagate": 0.0, "search": 0.0}
+
+    # Adds a hook that will receive every search event
+    def subscribe(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    # Runs engine.propagate(trail) for a node at depth and records what it did
+    def propagate(self, engine, trail, depth):
+        hidden = engine.hidden_singles
+        start = time.perf_counter()
+        result = engine.propagate(trail)
+        self.times["propagate"] += time.perf_counter() - start
+        hidden = engine.hidden_singles - hidden
+        self.nodes += 1
+        self.assignments += len(trail)
+        self.hidden_singles += hidden
+        self.naked_singles += len(trail) - hidden
+        if depth > self.max_depth:
+            self.max_depth = depth
+        for hook in self.hooks:
+            for i in trail:
+                hook(ASSIGN, i, engine.cells[i], depth)
+        return result
+
+    # Records that the search branches on cell i with `options` candidates
+    def branch(self, i, options, depth):
+        histogram = self.branching.setdefault(depth, {})
+        histogram[options] = histogram.get(options, 0) + 1
+        for hook in self.hooks:
+            hook(BRANCH, i, options, depth)
+
+    # Records a guessed digit
+    def guess(self, i, value, depth):
+        self.guesses += 1
+        self.assignments += 1
+        for hook in self.hooks:
+            hook(ASSIGN, i, value, depth)
+
+    # Records a guess that was taken back
+    def backtrack(self, i, depth):
+        self.backtracks += 1
+        for hook in self.hooks:
+            hook(BACKTRACK, i, 0, depth)
+
+    # Records the propagated cells of a failed node being taken back
+    def undo(self, trail, depth):
+        for hook in self.hooks:
+            for i in reversed(trail):
+                hook(BACKTRACK, i, 0, depth)
+
+    # Returns the statistics as a JSON-friendly dict
+    def as_dict(self):
+        return {
+            "nodes": self.nodes,
+            "assignments": self.assignments,
+            "guesses": self.guesses,
+            "backtracks": self.backtracks,
+            "naked_singles": self.naked_singles,
+            "hidden_singles": self.hidden_singles,
+            "max_depth": self.max_depth,
+            "branching": {str(depth): {str(options): n for options, n in sorted(histogram.items())}
+                          for depth, histogram in sorted(self.branching.items())},
+            "times_ms": {phase: round(seconds * 1000, 3) for phase, seconds in self.times.items()},
+        }
+
+
+# Function to solve the Sudoku in place, returns True if a solution was found.
+# Pass a SolveStats to record what the search did.
+def solve(board, stats=None):
+    if stats is None:
+        engine = Engine(board)
+        if not engine.consistent or not engine.search():
+            return False
+        engine.write(board)
+        return True
+
+    start = time.perf_counter()
+    engine = Engine(board, stats)
+    searched = time.perf_counter()
+    stats.times["setup"] += searched - start
+    propagating = stats.times["propagate"]
+    solved = engine.consistent and engine.search()
+    stats.times["search"] += time.perf_counter() - searched - (stats.times["propagate"] - propagating)
+    if solved:
+        engine.write(board)
+    return solved
+
+
+# Function to solve a copy of the board and check that the solution is unique.
+# Returns the solution as a new list of lists (None if there is none) and the
+# number of solutions, counted up to 2.
+def solve_unique(board):
+    engine = Engine(board)
+    if not engine.consistent:
+        return None, 0
+    first = []
+    count = engine.count(2, first)
+    if not count:
+        return None, 0
+    size = engine.size
+    return [first[r * size:(r + 1) * size] for r in range(size)], count
+
+
+# Generator over the solutions of a board, found lazily one at a time. By
+# default every solution is the engine's flat bytearray of cells, which is
+# reused for the next one (copy it to keep it); with copy=True every solution
+# is a new list of lists.
+def iter_solutions(board, copy=False):
+    engine = Engine(board)
+    if not engine.consistent:
+        return
+    size = engine.size
+    for cells in engine.solutions():
+        yield [list(cells[r * size:(r + 1) * size]) for r in range(size)] if copy else cells
+
+
+# Function to count the solutions of a board, stopping as soon as limit is
+# reached (count_solutions(board, 2) tells 0, 1 or "more than one" apart).
+# Without a limit every solution is counted.
+def count_solutions(board, limit=None):
+    engine = Engine(board)
+    if not engine.consistent:
+        return 0
+    return engine.count(float("inf") if limit is None else limit)
@@ -0,0 +1,36 @@
+# Registry of the available solver backends.
+#
+# Every backend is a function that takes a 9x9 board (list of lists or numpy
+# array, 0 for empty cells), fills it in place and returns True if it found a
+# solution. Callers pick a backend by name with get_solver().
+
+import cache
+import core
+import dlx
+
+# Name of the backend used when none is requested
+DEFAULT = "engine"
+
+SOLVERS = {}
+
+
+# Function to register a solver backend under a name
+def register(name, func):
+    SOLVERS[name] = func
+    return func
+
+
+# Function to look up a solver backend by name
+def get_solver(name=DEFAULT):
+    try:
+        return SOLVERS[name]
+    except KeyError:
+        raise ValueError("Unknown solver '{}', choose one of: {}".format(name, ", ".join(sorted(SOLVERS))))
+
+
+register("engine", core.solve)
+register("dlx", dlx.solve)
+register("backtrack", core.naive_solve)
+# The engine behind a per-process cache of canonical solutions, for workloads
+# that see the same puzzles again in other orientations
+register("cached", cache.solve)
@@ -1,17 +1,190 @@
-# Pygame is a library for making games in Python
-import pygame
-
 # The following are custom modules containing Sudoku related functions such as
-# validating Sudoku rules, solving the Sudoku, creating the Sudoku matrix etc.
-from test import valid, solve, create_matrix, print_sudoku, find_empty
+# solving the Sudoku and keeping the board state.
+# Registry of solver backends, the Grid picks one by name
+from solvers import get_solver
+# Bitmask board state and a solver that reports whether the solution is unique
+from solver import Engine, SolveStats, solve_unique, count_solutions, ASSIGN
+# Stock of fresh puzzles generated in the background
+from generator import PuzzlePool, generate, to_rows
+# Candidate bitboards with human solving techniques, for hints, pencil marks and ratings
+from hints import LogicBoard, rate
+# Recorded searches that can be replayed and scrubbed through
+from traces import Trace, record
 
-# Time and numpy are general purpose libraries
+# General purpose libraries
+import argparse
+import os
+import random
+import tempfile
 import time
-import numpy as np
+import threading
 import sys
 
-# Initializes pygame's font module
-pygame.font.init()
+# Pygame is a library for making games in Python. It is only imported by
+# init_pygame(), so importing this module needs neither pygame nor a display.
+pygame = None
+
+
+# Imports pygame and initializes its font module
+def init_pygame():
+    global pygame
+    import pygame
+    pygame.font.init()
+
+# Loaded fonts, keyed by (size, bold). SysFont has to search the system fonts,
+# so every font is only loaded once.
+FONTS = {}
+
+
+# Returns the "comicsans" font of the given size, loading it on first use
+def get_font(size, bold=False):
+    key = (size, bold)
+    if key not in FONTS:
+        FONTS[key] = pygame.font.SysFont("comicsans", size, bold=bold)
+    return FONTS[key]
+
+
+# Pre-rendered digit surfaces for one font size and cell size, so cubes only blit
+class GlyphAtlas:
+    # Text color of every glyph state
+    COLORS = {
+        "given": (0, 0, 0),  # Confirmed values
+        "sketch": (128, 128, 128),  # Penciled in values
+        "solving": (0, 0, 0),  # Values placed by the visual solver
+        "mark": (128, 128, 128),  # Automatic pencil marks, drawn with a smaller font
+    }
+    # Atlases that were already built, keyed by (font size, cell size)
+    atlases = {}
+
+    def __init__(self, font_size, cell_size):
+        self.font = get_font(font_size)
+        self.cell_size = cell_size
+        self.glyphs = {}
+        for state in self.COLORS:
+            for digit in range(1, 10):
+                self.glyph(state, digit)
+
+    # Returns the atlas for a font size and cell size, building it on first use
+    @classmethod
+    def get(cls, font_size, cell_size):
+        key = (font_size, cell_size)
+        if key not in cls.atlases:
+            cls.atlases[key] = cls(font_size, cell_size)
+        return cls.atlases[key]
+
+    # Returns (surface, offset inside the cell) for a digit, rendering it if it isn't cached yet.
+    # Sketches sit in the top left corner, everything else is centered.
+    def glyph(self, state, digit):
+        key = (state, digit)
+        if key not in self.glyphs:
+            text = self.font.render(str(digit), 1, self.COLORS[state])
+            if state == "sketch":
+                offset = (5, 5)
+            else:
+                offset = (self.cell_size/2 - text.get_width()/2, self.cell_size/2 - text.get_height()/2)
+            self.glyphs[key] = (text, offset)
+        return self.glyphs[key]
+
+    # Blits a digit into the cell whose top left corner is (x, y)
+    def blit(self, win, state, digit, x, y):
+        text, offset = self.glyph(state, digit)
+        win.blit(text, (x + offset[0], y + offset[1]))
+
+
+# A line of text that is only re-rendered when its content changes
+class Label:
+    def __init__(self, size, color, bold=False):
+        self.size = size
+        self.color = color
+        self.bold = bold
+        self.text = None
+        self.surface = None
+
+    # Returns the surface for text, re-rendering only if text differs from last time
+    def render(self, text):
+        if text != self.text:
+            self.text = text
+            self.surface = get_font(self.size, self.bold).render(text, 1, self.color)
+        return self.surface
+
+
+# Deals puzzles from a packed puzzle file (see packed.py) instead of the
+# generator. Every puzzle is read by index from the memory-mapped file, so the
+# file is never loaded as a whole. Starts at `index` and goes on with the next
+# puzzles, or picks them at random without an index.
+class FilePicker:
+    def __init__(self, path, index=None):
+        from packed import PuzzleFile
+        self.puzzles = PuzzleFile(path)
+        self.index = index
+
+    # Returns the next puzzle as a 9x9 list board, the tier is ignored
+    def take(self, tier=None):
+        if self.index is None:
+            return self.puzzles[random.randrange(len(self.puzzles))]
+        board = self.puzzles[self.index % len(self.puzzles)]
+        self.index += 1
+        return board
+
+    def stop(self):
+        self.puzzles.close()
+
+
+# Seconds within which two typed digits make one two-digit value
+TYPING_DELAY = 1.0
+
+
+# Turns key presses into cell values. Number keys give digits; on 16x16 boards
+# A-G give 10-16, and on boards larger than 9x9 two digits typed within
+# TYPING_DELAY seconds make one value (1 then 2 gives 12).
+class NumberInput:
+    def __init__(self, size):
+        self.size = size
+        self.pending = 0  # First digit of a two-digit value, 0 if none
+        self.typed_at = 0.0
+
+    # Digit of a number or keypad key, None for any other key
+    @staticmethod
+    def digit(key):
+        if pygame.K_0 <= key <= pygame.K_9:
+            return key - pygame.K_0
+        keypad = (pygame.K_KP0, pygame.K_KP1, pygame.K_KP2, pygame.K_KP3, pygame.K_KP4,
+                  pygame.K_KP5, pygame.K_KP6, pygame.K_KP7, pygame.K_KP8, pygame.K_KP9)
+        if key in keypad:
+            return keypad.index(key)
+        return None
+
+    # Returns the value typed with key, None if the key doesn't give one
+    def feed(self, key, now=None):
+        now = time.time() if now is None else now
+        if self.size == 16 and pygame.K_a <= key <= pygame.K_g:
+            self.pending = 0
+            return key - pygame.K_a + 10
+        digit = self.digit(key)
+        if digit is None:
+            return None
+        if self.pending and now - self.typed_at <= TYPING_DELAY and self.pending * 10 + digit <= self.size:
+            value = self.pending * 10 + digit
+            self.pending = 0
+            return value
+        # Remember the digit if another one could still follow it
+        self.pending = digit if 0 < digit * 10 <= self.size else 0
+        self.typed_at = now
+        return digit or None
+
+# Most events an R recording keeps (2 bytes each), so a search that runs for
+# ages on a hard 16x16 or 25x25 board can't fill the disk
+RECORD_LIMIT = 5000000
+# Seconds to wait on exit for a recording to stop and delete its file
+RECORD_STOP_WAIT = 2.0
+
+
+# Function to delete a file that may already be gone
+def discard_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
 
 class Grid:
     # Predefined Sudoku board that this code will solve.
@@ -26,87 +199,284 @@ class Grid:
         [9, 1, 0, 4, 0, 3, 7, 8, 0],
         [0, 8, 0, 0, 0, 1, 0, 0, 2]
     ]
-    # Converts the board list to a numpy array for more convenient manipulation
-    board = np.array(board)
+    # Name of the solver backend used to check placements (see solvers.py)
+    solver = "engine"
+    # Difficulty tier of the puzzles dealt by new_game()
+    tier = "medium"
+    # Speeds of the solve visualization in steps per second, None means instant
+    SPEEDS = [1, 2, 5, 10, 30, 100, 300, 1000, 10000, None]
+    # Seconds of searching per frame while the rest of a search runs without showing its steps
+    FINISH_SLICE = 0.02
 
     # Initializes the Grid object with dimensions, creates 'Cube' objects for each cell of the Sudoku
-    def __init__(self, rows, cols, width, height,):
+    # puzzles is an optional PuzzlePool (or FilePicker) that new_game() takes fresh boards from.
+    # rows and cols give the board size (9, 16 or 25); boards other than 9x9
+    # start with a fresh puzzle instead of the predefined one.
+    def __init__(self, rows, cols, width, height, puzzles=None):
         self.rows = rows
         self.cols = cols
         self.width = width
         self.height = height
-        self.model = None
+        self.puzzles = puzzles
+        self.state = None
         self.selected = None
-        self.cubes = [[Cube(self.board[i][j], i, j, width, height) for j in range(cols)] for i in range(rows)]
-        self.update_model()
+        self.solution_job = None
+        # Cells that changed since they were last drawn, as (row, col)
+        self.dirty = set()
+        # State of the solve visualization: the engine it runs on, its step
+        # generator, its search statistics, the board before solving and the
+        # cells highlighted this frame
+        self.solve_engine = None
+        self.solve_stats = None
+        self.solve_steps = None
+        self.solve_backup = None
+        self.solve_paused = False
+        # Set while the rest of the search runs without showing its steps (J)
+        self.solve_finishing = False
+        self.speed = self.SPEEDS.index(10)
+        self.step_budget = 0.0
+        self.highlighted = set()
+        # Candidates removed by hints as (cell, value), whether the automatic
+        # pencil marks are shown and need to be recomputed, and the last hint
+        self.eliminated = set()
+        self.show_marks = False
+        self.marks_stale = True
+        self.hint_text = None
+        # Set by start_solve() when the board has no or several solutions
+        self.warning = None
+        # Replay of a recorded search: the Trace, the number of its events
+        # shown so far, whether its file is a temporary one to delete
+        # afterwards, and the background job recording a new one
+        self.replay = None
+        self.replay_pos = 0
+        self.replay_owned = False
+        self.record_job = None
+        if rows == len(self.board):
+            self.load(self.board)
+        else:
+            self.new_game()
         self.solve = False
         self.solve_time = 0
 
-    # Updates the current Sudoku board model from the 'Cube' objects
-    def update_model(self):
-        self.model = [[self.cubes[i][j].value for j in range(self.cols)] for i in range(self.rows)]
+    # Loads a new puzzle into the grid and starts solving it in the background
+    def load(self, board):
+        self.board = [list(row) for row in board]
+        self.selected = None
+        self.cubes = [[Cube(self.board[i][j], i, j, self.width, self.height, self.cols) for j in range(self.cols)]
+                      for i in range(self.rows)]
+        # One flat board with row/column/box bitmasks, updated cell by cell
+        self.state = Engine(self.board)
+        self.dirty = {(i, j) for i in range(self.rows) for j in range(self.cols)}
+        self.eliminated = set()
+        self.marks_stale = True
+        self.hint_text = None
+        self.warning = None
+        # A recording of the previous puzzle is no longer wanted
+        self.cancel_recording()
+        self.start_solution()
+
+    # Starts a new game with a fresh puzzle from the pool, or the same puzzle again without one
+    def new_game(self):
+        self.stop_solve()
+        if self.puzzles is not None:
+            self.load(self.puzzles.take(self.tier))
+        elif len(self.board) == self.rows:
+            self.load(self.board)
+        else:
+            self.load(to_rows(generate(self.tier, size=self.rows)[0]))
+
+    # The current board as a new list of lists
+    @property
+    def model(self):
+        return self.state.to_rows()
+
+    # Sets the value of a cell in both the board state and its cube
+    def set_cell(self, row, col, val):
+        i = row * self.cols + col
+        if self.state.cells[i]:
+            self.state.unassign(i)
+        if val:
+            self.state.assign(i, val)
+        self.cubes[row][col].set(val)
+        self.dirty.add((row, col))
+        self.marks_stale = True
+        self.hint_text = None
+
+    # Solves and rates a copy of the current puzzle on a background thread so the UI doesn't stall.
+    # Every call starts a new job, so a result for an older puzzle is never used.
+    # "ready" is set as soon as the solution is known, so placing a digit never
+    # waits for the slower rating, which sets "rated". Both are set even if the
+    # work fails, so the UI can't wait on them forever.
+    def start_solution(self):
+        puzzle = self.model
+        job = {"ready": threading.Event(), "rated": threading.Event(), "solution": None, "count": 0, "rating": None}
+
+        def work():
+            try:
+                try:
+                    job["solution"], job["count"] = solve_unique(puzzle)
+                finally:
+                    job["ready"].set()
+                job["rating"] = rate(puzzle)
+            finally:
+                job["rated"].set()
+
+        self.solution_job = job
+        threading.Thread(target=work, daemon=True).start()
+
+    # Waits for the background job and returns the cached solution and the
+    # number of solutions (counted up to 2)
+    def get_solution(self):
+        job = self.solution_job
+        job["ready"].wait()
+        return job["solution"], job["count"]
+
+    # Difficulty of the puzzle by the hardest technique it needs, None until the background job has rated it
+    def rating_text(self):
+        job = self.solution_job
+        if not job["rated"].is_set() or job["rating"] is None:
+            return None
+        level, technique = job["rating"]
+        return level + (" (" + technique + ")" if technique else "")
+
+    # Finds the next logical move on the current board. A placement is penciled
+    # into its cell, which gets selected; removed candidates disappear from the
+    # pencil marks. The reason is kept in hint_text. Returns the move, None if
+    # there is none.
+    def hint(self):
+        logic = LogicBoard(self.model, self.eliminated)
+        move = logic.next_move()
+        if move is None:
+            self.hint_text = "solved" if logic.solved() else "no hint, this needs guessing"
+            return None
+        self.hint_text = move.technique + ": " + move.reason
+        if move.placements:
+            i, value = move.placements[0]
+            row, col = divmod(i, self.cols)
+            self.select(row, col)
+            self.sketch(value)
+        self.eliminated.update(move.eliminations)
+        self.marks_stale = True
+        return move
+
+    # Shows or hides the automatic pencil marks
+    def toggle_marks(self):
+        self.show_marks = not self.show_marks
+        self.marks_stale = True
+
+    # Recomputes the pencil marks of every cell if the board changed since the
+    # last time. They stay hidden during the solve visualization.
+    def update_marks(self):
+        if not self.marks_stale:
+            return
+        self.marks_stale = False
+        if self.show_marks and not self.solving():
+            candidates = LogicBoard(self.model, self.eliminated).candidates
+        else:
+            candidates = [0] * (self.rows * self.cols)
+        for i, marks in enumerate(candidates):
+            row, col = divmod(i, self.cols)
+            if self.cubes[row][col].marks != marks:
+                self.cubes[row][col].marks = marks
+                self.dirty.add((row, col))
 
     # Place a value on the board at the selected location
     def place(self, val):
         row, col = self.selected
         if self.cubes[row][col].value == 0:
-            self.cubes[row][col].set(val)
-            self.update_model()
+            # Checked before placing: does val clash with its row, column or box?
+            fits = self.state.fits(row * self.cols + col, val)
+            self.set_cell(row, col, val)
+            self.warning = None
 
-            # If the new value is valid and the board can be solved, return True
-            if valid(self.model, val, (row, col)) and solve(self.model):
+            solution, count = self.get_solution()
+            if count == 1:
+                # Unique puzzle: the move is right exactly when it matches the cached solution
+                correct = solution[row][col] == val
+            else:
+                # Several solutions: the move is right if the board can still be solved.
+                # The solver works on a copy so the live board is never touched.
+                correct = fits and get_solver(self.solver)(self.model)
+            if correct:
                 return True
             else:
                 # If not, reset the value of the cube and return False
-                self.cubes[row][col].set(0)
+                self.set_cell(row, col, 0)
                 self.cubes[row][col].set_temp(0)
-                self.update_model()
                 return False
 
     # Temporary sketch value on the board at the selected location
     def sketch(self, val):
         row, col = self.selected
-        self.cubes[row][col].set_temp(val)  # This function is used to sketch or "pencil in" a value without confirming it
+        if self.cubes[row][col].temp != val:
+            self.cubes[row][col].set_temp(val)  # This function is used to sketch or "pencil in" a value without confirming it
+            self.dirty.add((row, col))
 
     # Draws the current state of the board on the pygame window
     def draw(self, win):
-        gap = self.width / 9  # Calculate the width of each Sudoku cell (the board is divided into 9 parts)
+        self.draw_lines(win)
 
-        # Draw lines to make the grid. Every third line is thicker to separate the 3x3 subgrids
+        # Draw each individual cell/cube on the grid
+        for i in range(self.rows):
+            for j in range(self.cols):
+                self.cubes[i][j].draw(win)
+        self.dirty.clear()
+
+    # Draw lines to make the grid. The lines between boxes (every third line on a 9x9 board) are thicker
+    def draw_lines(self, win):
+        gap = self.width / self.cols  # Calculate the width of each Sudoku cell
+        box = self.state.layout.box
         for i in range(self.rows + 1):
-            if i % 3 == 0 and i != 0:
+            if i % box == 0 and i != 0:
                 thick = 4
             else:
                 thick = 1
             pygame.draw.line(win, (0, 0, 0), (0, i * gap), (self.width, i * gap), thick)
             pygame.draw.line(win, (0, 0, 0), (i * gap, 0), (i * gap, self.height), thick)
 
-        # Draw each individual cell/cube on the grid
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.cubes[i][j].draw(win)
+    # Screen rectangle covered by a cell
+    def cell_rect(self, row, col):
+        gap = self.width / self.cols
+        return pygame.Rect(int(col * gap), int(row * gap), int(gap) + 1, int(gap) + 1)
+
+    # Redraws a single cell, clipped to its rectangle, and returns that rectangle
+    def draw_cell(self, win, row, col):
+        rect = self.cell_rect(row, col)
+        win.set_clip(rect)
+        win.fill((255, 255, 255), rect)
+        self.draw_lines(win)  # Restores the parts of the grid lines inside the cell
+        self.cubes[row][col].draw(win)
+        win.set_clip(None)
+        return rect
 
-    # Method to select a cell on the grid. All other cells are deselected.
+    # Redraws only the cells that changed since the last frame and returns their rectangles
+    def draw_dirty(self, win):
+        rects = [self.draw_cell(win, row, col) for row, col in self.dirty]
+        self.dirty.clear()
+        return rects
+
+    # Method to select a cell on the grid. The previously selected cell is deselected.
     def select(self, row, col):
-        # Deselect all cubes first
-        for i in range(self.rows):
-            for j in range(self.cols):
-                self.cubes[i][j].selected = False
+        if self.selected:
+            self.cubes[self.selected[0]][self.selected[1]].selected = False
+            self.dirty.add(self.selected)
 
         # Select the clicked cube
         self.cubes[row][col].selected = True
         self.selected = (row, col)  # Save the selected cell's coordinates
+        self.dirty.add(self.selected)
 
     # Method to clear the selected cell's temporary value
     def clear(self):
         row, col = self.selected
         if self.cubes[row][col].value == 0:  # Only clears the cell if the value is 0 (not a given number)
             self.cubes[row][col].set_temp(0)  # Resets the temporary value to 0
+            self.dirty.add((row, col))
 
     # Method to convert a screen space click into grid coordinates
     def click(self, pos):
         if pos[0] < self.width and pos[1] < self.height:  # If the click is within the bounds of the grid
-            gap = self.width / 9  # Calculate the width of each Sudoku cell (the board is divided into 9 parts)
+            gap = self.width / self.cols  # Calculate the width of each Sudoku cell
             x = pos[0] // gap  # Determine the X coordinate in grid space
             y = pos[1] // gap  # Determine the Y coordinate in grid space
 
@@ -115,58 +485,260 @@ class Grid:
             return None  # If the click was outside the grid, return None
 
 
-    # Method to check if the Sudoku puzzle has been solved. If any cell is still 0, it returns False.
+    # Method to check if the Sudoku puzzle has been solved, using the running count of empty cells
     def is_finished(self):
-        for i in range(self.rows):
-            for j in range(self.cols):
-                if self.cubes[i][j].value == 0:  # If a cell's value is still 0, the puzzle is not solved
-                    return False
-        return True  # If no cell is 0, the puzzle is solved
-
-    # Method to solve the Sudoku puzzle using a backtracking algorithm. It also updates the GUI with the progress.
-    def solve_gui(self, win):
-        self.update_model()  # Update the model to the current state
-        find = find_empty(self.model)  # Find an empty cell in the puzzle
-        if not find:  # If there are no empty cells, the puzzle is solved
-            return True
-        else:  # If there are empty cells, try to solve for them
-            row, col = find  # Get the coordinates of the empty cell
-
-        # Try each number from 1 to 9
-        for i in range(1, 10):
-            # If the number is valid according to Sudoku rules, try to solve with that number
-            if valid(self.model, i, (row, col)):
-                self.model[row][col] = i  # Set the cell to the number
-                self.cubes[row][col].set(i)  # Update the GUI with the new number
-                self.cubes[row][col].draw_change(win, True)  # Highlight the change in the GUI
-                self.update_model()  # Update the model to the current state
-                pygame.display.update()  # Update the display
-                pygame.time.delay(100)  # Delay to slow down the solving process for visibility
-
-                # Recursive call to continue solving
-                if self.solve_gui(win):
-                    return True
-
-                # If the number doesn't lead to a solution, reset the cell and backtrack
-                self.model[row][col] = 0
-                self.cubes[row][col].set(0)
-                self.update_model()
-                self.cubes[row][col].draw_change(win, False)  # Show the backtrack in the GUI
-                pygame.display.update()
-                pygame.time.delay(100)
-
-        # If no number leads to a solution, return False to trigger backtracking
-        return False
+        return self.state.empty == 0
+
+    # Starts the solve visualization. The search runs on its own copy of the board
+    # in the fast engine and is advanced a few steps per frame by advance_solve().
+    # The solutions of the current board are counted first (up to 2): a board
+    # without a solution isn't searched at all, and the player is warned when
+    # there are several. Nothing starts while a recording (R) is being made,
+    # since its replay takes over the board. Returns False if the visualization didn't start.
+    def start_solve(self):
+        if self.record_job is not None:
+            self.warning = "wait for the recording to finish"
+            return False
+        count = count_solutions(self.model, 2)
+        if count == 0:
+            self.warning = "this board has no solution"
+            return False
+        self.warning = "this board has more than one solution" if count > 1 else None
+        self.solve_stats = SolveStats()
+        self.solve_engine = Engine(self.model, self.solve_stats)
+        self.solve_steps = self.solve_engine.steps() if self.solve_engine.consistent else iter(())
+        self.solve_backup = bytes(self.state.cells)
+        self.solve_paused = False
+        self.step_budget = 0.0
+        self.marks_stale = True
+        return True
+
+    # True while a solve visualization is running or paused
+    def solving(self):
+        return self.solve_steps is not None
+
+    # Pauses or resumes the solve visualization
+    def toggle_pause(self):
+        self.solve_paused = not self.solve_paused
+        if not self.solve_paused and self.replay is not None and self.replay_pos == len(self.replay):
+            # Resuming a replay at its end plays it again from the start
+            self.seek(0)
+
+    # Changes the visualization speed by delta steps in SPEEDS
+    def change_speed(self, delta):
+        self.speed = min(max(self.speed + delta, 0), len(self.SPEEDS) - 1)
+        self.step_budget = 0.0
+
+    # Human readable visualization speed
+    def speed_text(self):
+        speed = self.SPEEDS[self.speed]
+        return "instant" if speed is None else str(speed) + " steps/s"
+
+    # Search counters of the running solve visualization, or the position in a replay
+    def stats_text(self):
+        if self.replay is not None:
+            return "step {}/{}".format(self.replay_pos, len(self.replay))
+        stats = self.solve_stats
+        return "nodes {}, assigned {}, backtracks {}, max depth {}".format(
+            stats.nodes, stats.assignments, stats.backtracks, stats.max_depth)
+
+    # Applies one (kind, cell, value) event from the step generator to the board
+    def apply_step(self, step):
+        kind, i, value = step
+        row, col = divmod(i, self.cols)
+        self.set_cell(row, col, value)
+        self.cubes[row][col].highlight = kind
+        self.highlighted.add((row, col))
+
+    # Removes the assign/backtrack borders of the previous frame
+    def clear_highlights(self):
+        for row, col in self.highlighted:
+            self.cubes[row][col].highlight = None
+            self.dirty.add((row, col))
+        self.highlighted.clear()
+
+    # Sets every cell to the values in cells (a flat sequence), touching only the ones that differ
+    def set_cells(self, cells):
+        for i, value in enumerate(cells):
+            if self.state.cells[i] != value:
+                self.set_cell(i // self.cols, i % self.cols, value)
+
+    # Ends the solve visualization or replay
+    def stop_solve(self):
+        self.clear_highlights()
+        self.solve_engine = None
+        self.solve_steps = None
+        self.solve_backup = None
+        self.solve_finishing = False
+        self.marks_stale = True
+        if self.replay is not None:
+            self.replay.close()
+            if self.replay_owned:
+                os.remove(self.replay.path)
+            self.replay = None
+
+    # Records the search of the current board into a temporary trace file on a
+    # background thread, at most RECORD_LIMIT events of it. poll_recording()
+    # starts the replay once it is done, cancel_recording() stops it.
+    def start_recording(self):
+        if self.record_job is not None:
+            return
+        puzzle = self.model
+        handle, path = tempfile.mkstemp(suffix=".sdt")
+        os.close(handle)
+        job = {"ready": threading.Event(), "stop": threading.Event(), "path": path, "count": 0}
+
+        def work():
+            try:
+                job["count"] = record(puzzle, path, limit=RECORD_LIMIT, stop=job["stop"])[0]
+            finally:
+                # Either this thread or cancel_recording() deletes the file of a cancelled recording
+                job["ready"].set()
+                if job["stop"].is_set():
+                    discard_file(path)
+
+        self.record_job = job
+        threading.Thread(target=work, daemon=True).start()
+
+    # Stops a pending recording and deletes its file. With wait, waits up to
+    # RECORD_STOP_WAIT seconds for it, so the file is gone before the game exits.
+    def cancel_recording(self, wait=False):
+        job = self.record_job
+        if job is None:
+            return
+        self.record_job = None
+        self.warning = None
+        job["stop"].set()
+        if wait:
+            job["ready"].wait(RECORD_STOP_WAIT)
+        if wait or job["ready"].is_set():
+            discard_file(job["path"])
+
+    # Starts the replay of a finished recording
+    def poll_recording(self):
+        job = self.record_job
+        if job is not None and job["ready"].is_set():
+            self.record_job = None
+            self.warning = "recording stopped after {} steps".format(RECORD_LIMIT) if job["count"] >= RECORD_LIMIT else None
+            self.start_replay(Trace(job["path"]), owned=True)
 
+    # Replays a recorded search with the controls of the solve visualization.
+    # A running visualization is cancelled first, so the board it puts back is
+    # the one ESC restores after the replay. With owned=True the trace file is
+    # deleted when the replay ends.
+    def start_replay(self, trace, owned=False):
+        self.cancel_solve()
+        self.replay = trace
+        self.replay_owned = owned
+        self.solve_backup = bytes(self.state.cells)
+        self.solve_paused = False
+        self.step_budget = 0.0
+        self.seek(0)
+
+    # Generator over the events of the replay from the current position on
+    def replay_steps(self):
+        trace = self.replay
+        while self.replay_pos < len(trace):
+            step = trace.event(self.replay_pos)
+            self.replay_pos += 1
+            yield step
+
+    # Shows the board after `step` events of the replay. The board is rebuilt
+    # from the nearest keyframe, so this takes the same time anywhere.
+    def seek(self, step):
+        trace = self.replay
+        step = min(max(step, 0), len(trace))
+        self.clear_highlights()
+        self.set_cells(trace.board_at(step))
+        self.replay_pos = step
+        if step:
+            kind, i, value = trace.event(step - 1)
+            row, col = divmod(i, self.cols)
+            self.cubes[row][col].highlight = kind
+            self.highlighted.add((row, col))
+        self.solve_steps = self.replay_steps()
+        self.marks_stale = True
+
+    # Moves the replay by delta steps and pauses it
+    def scrub(self, delta):
+        if self.replay is not None:
+            self.solve_paused = True
+            self.seek(self.replay_pos + delta)
+
+    # Runs the solve visualization for one frame that lasted dt seconds
+    def advance_solve(self, dt):
+        if not self.solving() or self.solve_paused:
+            return
+        self.clear_highlights()
+        speed = self.SPEEDS[self.speed]
+        if speed is None and self.replay is not None:
+            # Instant: go to the end of the replay
+            self.seek(len(self.replay))
+            self.solve_paused = True
+            return
+        if speed is None or self.solve_finishing:
+            # Instant: finish the search without showing the steps
+            self.finish_solve()
+            return
+
+        self.step_budget += speed * dt
+        while self.step_budget >= 1:
+            self.step_budget -= 1
+            step = next(self.solve_steps, None)
+            if step is None:
+                if self.replay is not None:
+                    # A replay stays open at its end, so it can be scrubbed back
+                    self.solve_paused = True
+                else:
+                    self.stop_solve()
+                return
+            self.apply_step(step)
+
+    # Cancels the solve visualization and puts the board back as it was
+    def cancel_solve(self):
+        if self.solving():
+            self.set_cells(self.solve_backup)
+            self.stop_solve()
+
+    # Runs the rest of the search without showing the steps and ends the visualization
+    # Runs the search without showing the steps for FINISH_SLICE seconds, so a
+    # long search doesn't freeze the window, and ends the visualization once
+    # it is done. Called every frame until then.
+    def finish_solve(self):
+        self.solve_finishing = True
+        self.solve_paused = False
+        end = time.perf_counter() + self.FINISH_SLICE
+        for count, _ in enumerate(self.solve_steps):
+            if count % 32 == 31 and time.perf_counter() >= end:
+                # Show how far the search got and go on next frame
+                self.set_cells(self.solve_engine.cells)
+                return
+        self.set_cells(self.solve_engine.cells)
+        self.stop_solve()
+
+    # Stops the solve visualization and shows the cached solution right away.
+    # The cached solution is only used when it is the puzzle's only one: with
+    # several, the player's placements may belong to another solution, so the
+    # search is finished from the current board instead. A replay jumps to its
+    # end.
+    def jump_to_solution(self):
+        if self.replay is not None:
+            self.scrub(len(self.replay))
+        elif self.solving():
+            solution, count = self.get_solution()
+            if count != 1:
+                self.finish_solve()
+                return
+            self.set_cells(self.solve_backup)
+            self.set_cells([value for row in solution for value in row])
+            self.stop_solve()
 
 
 # The Cube class represents a cell in the Sudoku grid
 class Cube:
-    rows = 9  # Number of rows in a Sudoku grid
-    cols = 9  # Number of columns in a Sudoku grid
-
-    # Constructor for the Cube class
-    def __init__(self, value, row, col, width, height):
+    # Constructor for the Cube class. width and height are those of the whole
+    # grid, which has size cells per side.
+    def __init__(self, value, row, col, width, height, size=9):
         self.value = value  # Value in the cell (0 if the cell is empty)
         self.temp = 0  # Temporary value penciled in
         self.row = row  # Row index of the cell in the grid
@@ -174,44 +746,45 @@ class Cube:
         self.width = width  # Width of the cell
         self.height = height  # Height of the cell
         self.selected = False  # Whether the cell is selected
-        self.gap = self.width / 9  # The gap between cells
+        self.highlight = None  # ASSIGN or BACKTRACK while the solve visualization just changed the cell
+        self.marks = 0  # Bitmask of the automatic pencil marks, bit d - 1 for digit d
+        self.box = int(round(size ** 0.5))  # Pencil marks are laid out like the cells of a box
+        self.gap = self.width / size  # The gap between cells
+        self.font_size = int(self.gap * 2 / 3)  # 40 on a 9x9 board
         self.x = self.col * self.gap  # The x-coordinate of the top left corner of the cell
         self.y = self.row * self.gap  # The y-coordinate of the top left corner of the cell
 
     # Draws the Cube on the pygame window
     def draw(self, win):
-        fnt = pygame.font.SysFont("comicsans", 40)
+        atlas = GlyphAtlas.get(self.font_size, self.gap)
+
+        # If the solve visualization just changed the cell, show its value with a
+        # green border for an assignment or a red border for a backtrack
+        if self.highlight is not None:
+            if self.value:
+                atlas.blit(win, "solving", self.value, self.x, self.y)
+            color = (0, 255, 0) if self.highlight == ASSIGN else (255, 0, 0)
+            pygame.draw.rect(win, color, (self.x, self.y, self.gap, self.gap), 3)
+            return
 
         # If a temporary value is entered, show it in light grey
         if self.temp != 0 and self.value == 0:
-            text = fnt.render(str(self.temp), 1, (128, 128, 128))
-            win.blit(text, (self.x + 5, self.y + 5))
+            atlas.blit(win, "sketch", self.temp, self.x, self.y)
         # If a final value is entered, show it in black
         elif not(self.value == 0):
-            text = fnt.render(str(self.value), 1, (0, 0, 0))
-            win.blit(text, (self.x + (self.gap/2 - text.get_width()/2), self.y + (self.gap/2 - text.get_height()/2)))
+            atlas.blit(win, "given", self.value, self.x, self.y)
+        # Otherwise show the automatic pencil marks, each digit in its own spot
+        elif self.marks:
+            sub = self.gap / self.box
+            marks = GlyphAtlas.get(max(int(sub * 0.8), 8), sub)
+            for d in range(self.marks.bit_length()):
+                if self.marks >> d & 1:
+                    marks.blit(win, "mark", d + 1, self.x + d % self.box * sub, self.y + d // self.box * sub)
 
         # If the cell is selected, highlight it with a red border
         if self.selected:
             pygame.draw.rect(win, (255, 0, 0), (self.x, self.y, self.gap, self.gap), 3)
 
-    # Highlights the cell in green or red, depending on the value of g
-    def draw_change(self, win, g=True):
-        fnt = pygame.font.SysFont("comicsans", 40)
-
-        # Clear the cell
-        pygame.draw.rect(win, (255, 255, 255), (self.x, self.y, self.gap, self.gap), 0)
-
-        # Draw the value of the cell
-        text = fnt.render(str(self.value), 1, (0, 0, 0))
-        win.blit(text, (self.x + (self.gap/2 - text.get_width()/2), self.y + (self.gap/2 - text.get_height()/2)))
-
-        # If g is True, draw a green border; otherwise, draw a red border
-        if g:
-            pygame.draw.rect(win, (0, 255, 0), (self.x, self.y, self.gap, self.gap), 3)
-        else:
-            pygame.draw.rect(win, (255, 0, 0), (self.x, self.y, self.gap, self.gap), 3)
-
     # Sets the final value of the cell
     def set(self, val):
         self.value = val
@@ -220,30 +793,57 @@ class Cube:
     def set_temp(self, val):
         self.temp = val  # Sets a temporary value for the cell
 
+# Status line labels, re-rendered only when the time or the number of mistakes changes
+time_label = Label(40, (0, 0, 0))
+strickers_label = Label(40, (255, 0, 0))
+
+# Rendered draw_text strings, keyed by (text, size). Only a handful of fixed texts use it.
+TEXTS = {}
+
+
+# Frame-rate cap of the main loop
+FPS = 30
+
+
 # Redraws the entire game window
 def redraw_window(win, board, time, strickers):
     win.fill((255, 255, 255))  # Fills the window with white color
+    draw_status(win, board, time, strickers, True)
+
+    # Draw the Sudoku board on the window
+    board.draw(win)
 
-    # Sets the font for the text
-    fnt = pygame.font.SysFont("comicsans", 40)
 
-    # Creates a text surface displaying the time and blits it onto the window
-    text = fnt.render("Time: " + format_time(time), 1, (0, 0, 0))
-    win.blit(text, (300, 540))  # Blit is a pygame function to draw one image onto another
+# Redraws the status line under the board if the time or the number of mistakes
+# (strickers) changed, or always with force=True. Returns the rectangles drawn.
+def draw_status(win, board, time, strickers, force=False):
+    time_text = "Time: " + format_time(time)
+    strickers_text = "Strickers: " + str(strickers)
+    if not force and time_text == time_label.text and strickers_text == strickers_label.text:
+        return []
 
-    # Creates a text surface displaying the number of mistakes (strickers) and blits it onto the window
-    text = fnt.render("Strickers: " + str(strickers), 1, (255, 0, 0))
-    win.blit(text, (20, 540))
+    rect = pygame.Rect(0, board.height, win.get_width(), win.get_height() - board.height)
+    win.set_clip(rect)
+    win.fill((255, 255, 255), rect)
+    # Blit is a pygame function to draw one image onto another
+    win.blit(time_label.render(time_text), (300, 540))
+    win.blit(strickers_label.render(strickers_text), (20, 540))
+    board.draw_lines(win)  # The bottom grid line reaches into the status line
+    win.set_clip(None)
+    return [rect]
 
-    # Draw the Sudoku board on the window
-    board.draw(win)
+
+# Redraws only what changed since the last frame and returns the rectangles to update
+def redraw_dirty(win, board, time, strickers):
+    return board.draw_dirty(win) + draw_status(win, board, time, strickers)
 
 
 def draw_text(text, size, x, y ,win):
-    # Defines the font and size for the text
-    font = pygame.font.SysFont("comicsans", size, bold=True)
-    # Renders the text
-    text = font.render(text, True, (0, 0, 0))
+    # Renders the text once and reuses the surface afterwards
+    key = (text, size)
+    if key not in TEXTS:
+        TEXTS[key] = get_font(size, bold=True).render(text, True, (0, 0, 0))
+    text = TEXTS[key]
     # Creates a rectangle object for the text surface object
     text_rect = text.get_rect()
     # Positions the center of the rectangle at specified coordinates
@@ -257,69 +857,49 @@ def draw_button(text, color, x, y, w, h, win):
     # Calls draw_text function to draw text onto the button
     draw_text(text, 30, x + w/2, y, win)
 
-def button_clicked(x, y, w, h):
-    # Gets the current position of the mouse
-    mouse = pygame.mouse.get_pos()
-    # Gets the state of the mouse buttons
-    click = pygame.mouse.get_pressed()
-    # Checks if the mouse is within the dimensions of the button and if it has been clicked
-    if x + w > mouse[0] > x and y + h > mouse[1] > y:
-        if click[0] == 1:
-            return True
-    return False
+def button_clicked(x, y, w, h, pos):
+    # Checks if the click position is within the dimensions of the button
+    return x + w > pos[0] > x and y + h > pos[1] > y
+
+# Draws a dialog with a title and buttons, then sleeps until one of the buttons is clicked.
+# buttons is a list of (text, color, x, y, w, h); returns the index of the clicked button.
+def dialog(win, title, buttons):
+    # Fills the window with white color
+    win.fill((255, 255, 255))
+    # Draws the title text onto the window
+    draw_text(title, 30, win.get_width()/2, win.get_height()/2 - 60, win)
+    # Draws the buttons onto the window
+    for text, color, x, y, w, h in buttons:
+        draw_button(text, color, x, y, w, h, win)
+    # Updates the contents of the display once, nothing changes until a click
+    pygame.display.update()
 
-def ask_quit(win):
     while True:
-        # Checks for a QUIT event
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                # Quits the game and exits the program
-                pygame.quit()
-                sys.exit()
-        # Fills the window with white color
-        win.fill((255, 255, 255))
-        # Draws the quit confirmation text onto the window
-        draw_text("Do you want to quit?", 30, win.get_width()/2, win.get_height()/2 - 60, win)
-        # Draws the "Yes" button onto the window
-        draw_button("Yes", (0, 255, 0), win.get_width()/2 - 100, win.get_height()/2 , 80, 40, win)
-        # Draws the "No" button onto the window
-        draw_button("No", (255, 0, 0),  win.get_width()/2 + 20, win.get_height()/2 , 80, 40, win)
-
-        # Checks if the "Yes" button is clicked
-        if button_clicked(win.get_width()/2 - 100, win.get_height()/2 , 80, 40):
-            return True
-        # Checks if the "No" button is clicked
-        elif button_clicked(win.get_width()/2 + 20, win.get_height()/2 , 80, 40):
-            return False
-        # Updates the contents of the display
-        pygame.display.update()
+        # Blocks until the next event instead of spinning
+        event = pygame.event.wait()
+        if event.type == pygame.QUIT:
+            # Quits the game and exits the program
+            pygame.quit()
+            sys.exit()
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            for index, (_, _, x, y, w, h) in enumerate(buttons):
+                if button_clicked(x, y, w, h, event.pos):
+                    return index
+
+def ask_quit(win):
+    # Returns True if "Yes" is clicked, False if "No" is clicked
+    return dialog(win, "Do you want to quit?", [
+        ("Yes", (0, 255, 0), win.get_width()/2 - 100, win.get_height()/2, 80, 40),
+        ("No", (255, 0, 0), win.get_width()/2 + 20, win.get_height()/2, 80, 40),
+    ]) == 0
 
 
 def lost(win):
-    while True:
-        # Checks for a QUIT event
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                # Quits the game and exits the program
-                pygame.quit()
-                sys.exit()
-        # Fills the window with white color
-        win.fill((255, 255, 255))
-        # Draws the game over text onto the window
-        draw_text("You lost!", 30, win.get_width()/2, win.get_height()/2 - 60, win)
-        # Draws the "Play again" button onto the window
-        draw_button("Play again", (0, 255, 0), win.get_width()/2 - 200, win.get_height()/2 , 160, 50, win)
-        # Draws the "Quit" button onto the window
-        draw_button("Quit", (255, 0, 0),  win.get_width()/2 + 60, win.get_height()/2 , 160, 50, win)
-
-        # Checks if the "Play again" button is clicked
-        if button_clicked(win.get_width()/2 - 200, win.get_height()/2 , 160, 50):
-            return True
-        # Checks if the "Quit" button is clicked
-        elif button_clicked(win.get_width()/2 + 60, win.get_height()/2 , 160, 50):
-            return False
-        # Updates the contents of the display
-        pygame.display.update()
+    # Returns True if "Play again" is clicked, False if "Quit" is clicked
+    return dialog(win, "You lost!", [
+        ("Play again", (0, 255, 0), win.get_width()/2 - 200, win.get_height()/2, 160, 50),
+        ("Quit", (255, 0, 0), win.get_width()/2 + 60, win.get_height()/2, 160, 50),
+    ]) == 0
 
 def format_time(secs):
     # Converts the time in seconds to hours, minutes, and seconds format
@@ -331,12 +911,31 @@ def format_time(secs):
     mat = " " + str(minute) + ":" + str(sec)
     return mat
 
-def main():
+def main(fps=FPS, size=9, puzzle_file=None, index=None, replay_file=None):
+    init_pygame()
     # Initialize the window with a specific size and set the caption as "Sudoku"
     win = pygame.display.set_mode((540, 600))
     pygame.display.set_caption("Sudoku")
-    # Create a new Grid object with 9 rows, 9 columns, and a specific size
-    board = Grid(9, 9, 540, 540)
+    trace = None
+    if replay_file:
+        # Replay a recorded search; the board size comes from the trace
+        trace = Trace(replay_file)
+        size = trace.size
+    if puzzle_file:
+        # Play the puzzles of a packed file
+        puzzles = FilePicker(puzzle_file, index)
+    else:
+        # Keep a few fresh puzzles ready for "Play again", generated by one background process
+        puzzles = PuzzlePool(target=5, processes=1, size=size).start()
+    # Create a new Grid object with size rows and columns (9x9 by default), and a specific size on screen
+    board = Grid(size, size, 540, 540, puzzles)
+    if puzzle_file:
+        board.new_game()
+    if trace is not None:
+        board.load(to_rows(trace.board_at(0)))
+        board.start_replay(trace)
+    # Turns key presses into cell values
+    typing = NumberInput(size)
     # Initialize the key variable that will hold the number entered by the user
     key = None
     # Control variable for the main loop
@@ -345,68 +944,77 @@ def main():
     start = time.time()
     # Counter for mistakes made by the player
     strickers = 0
+    # Caps the frame rate of the main loop
+    clock = pygame.time.Clock()
+    # Set when the whole window has to be redrawn, e.g. after a dialog
+    full_redraw = True
 
     # Main loop
     while run:
-        # Calculate the elapsed time
-        play_time = round(time.time() - start)
+        events = pygame.event.get()
+        animating = (board.solving() and not board.solve_paused) or board.record_job is not None
+        if not events and not board.dirty and not full_redraw and not animating:
+            # Nothing to do: sleep until the next event or the next timer tick
+            timeout = 1000 - int((time.time() - start) * 1000) % 1000
+            event = pygame.event.wait(timeout)
+            if event.type != pygame.NOEVENT:
+                events = [event] + pygame.event.get()
 
         # Event loop
-        for event in pygame.event.get():
+        for event in events:
             if event.type == pygame.QUIT:
                 # Ask the player if they want to quit when they close the window
+                full_redraw = True
                 if ask_quit(win):
                     run = False
                 else:
                     continue
             # If a key is pressed
             if event.type == pygame.KEYDOWN:
-                # Check for number keys 1-9 and numpad keys 1-9
-                # If any of these keys is pressed, assign its value to key
-                if event.key == pygame.K_1:
-                    key = 1
-                if event.key == pygame.K_2:
-                    key = 2
-                if event.key == pygame.K_3:
-                    key = 3
-                if event.key == pygame.K_4:
-                    key = 4
-                if event.key == pygame.K_5:
-                    key = 5
-                if event.key == pygame.K_6:
-                    key = 6
-                if event.key == pygame.K_7:
-                    key = 7
-                if event.key == pygame.K_8:
-                    key = 8
-                if event.key == pygame.K_9:
-                    key = 9
-                if event.key == pygame.K_KP1:
-                    key = 1
-                if event.key == pygame.K_KP2:
-                    key = 2
-                if event.key == pygame.K_KP3:
-                    key = 3
-                if event.key == pygame.K_KP4:
-                    key = 4
-                if event.key == pygame.K_KP5:
-                    key = 5
-                if event.key == pygame.K_KP6:
-                    key = 6
-                if event.key == pygame.K_KP7:
-                    key = 7
-                if event.key == pygame.K_KP8:
-                    key = 8
-                if event.key == pygame.K_KP9:
-                    key = 9
-                if event.key == pygame.K_DELETE:
+                # Turn number keys (and A-G on 16x16 boards) into a value for the selected cell
+                value = typing.feed(event.key)
+                if value is not None:
+                    key = value
+                if event.key == pygame.K_DELETE and not board.solving():
                     board.clear()
                     key = None
-                    # If the space key is pressed, solve the board
+                    # If the space key is pressed, start solving the board, or pause/resume the solver
                 if event.key == pygame.K_SPACE:
-                    board.solve_gui(win)
+                    if board.solving():
+                        board.toggle_pause()
+                    else:
+                        board.start_solve()
+                # Controls of the solve visualization: ESC cancels, +/- change the speed,
+                # I switches to instant and J jumps straight to the solution
+                if event.key == pygame.K_ESCAPE:
+                    board.cancel_solve()
+                    board.cancel_recording()
+                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    board.change_speed(1)
+                if event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    board.change_speed(-1)
+                if event.key == pygame.K_i:
+                    board.change_speed(len(board.SPEEDS))
+                if event.key == pygame.K_j:
+                    board.jump_to_solution()
+                # H pencils in the next logical move, P shows or hides the pencil marks
+                if event.key == pygame.K_h and not board.solving():
+                    board.hint()
+                    key = None
+                if event.key == pygame.K_p:
+                    board.toggle_marks()
+                # R records the search of the current board and replays it. In a replay the
+                # arrow keys step back and forth, PAGE UP/DOWN jump and HOME/END go to either end.
+                if event.key == pygame.K_r and not board.solving():
+                    board.start_recording()
+                if board.replay is not None:
+                    jump = max(1, len(board.replay) // 20)
+                    moves = {pygame.K_LEFT: -1, pygame.K_RIGHT: 1, pygame.K_PAGEUP: -jump, pygame.K_PAGEDOWN: jump,
+                             pygame.K_HOME: -len(board.replay), pygame.K_END: len(board.replay)}
+                    if event.key in moves:
+                        board.scrub(moves[event.key])
                     # If the return key is pressed
-                if event.key == pygame.K_RETURN:
+                if event.key == pygame.K_RETURN and board.selected and not board.solving():
                     # If there's a temporary value on the selected square
                     i, j = board.selected
                     if board.cubes[i][j].temp != 0:
@@ -418,9 +1026,10 @@ def main():
                             strickers += 1
                             # If the player has made 3 mistakes, end the game
                             if strickers == 3:
+                                full_redraw = True
                                 if lost(win):
-                                    # If the player wants to play again, reset the game
-                                    board.clear()
+                                    # If the player wants to play again, start over with a new puzzle
+                                    board.new_game()
                                     strickers = 0
                                     start = time.time()
                                 # Otherwise, exit the game
@@ -442,11 +1051,54 @@ def main():
         # If a square is selected and a number key was pressed, sketch that number on the square
         if board.selected and key != None:
             board.sketch(key)
-        # Redraw the window and update the display
-        redraw_window(win, board, play_time, strickers)
-        pygame.display.update()
-
-# Run the main function
-main()
-# Quit Pygame when the main function returns
-pygame.quit()
\ No newline at end of file
+
+        # Run the solve visualization for this frame, never longer than 0.1 s worth of steps
+        board.poll_recording()
+        board.advance_solve(min(clock.get_time() / 1000, 0.1))
+        board.update_marks()
+        if board.solving():
+            caption = ("Sudoku - " + ("replay" if board.replay is not None else "solving") + " at " + board.speed_text() + (" (paused)" if board.solve_paused else "") +
+                       " - " + board.stats_text())
+        else:
+            # Difficulty rating and the last hint
+            caption = "Sudoku - recording" if board.record_job is not None else "Sudoku"
+            rating = board.rating_text()
+            if rating:
+                caption += " - " + rating
+            if board.hint_text:
+                caption += " - hint: " + board.hint_text
+        if board.warning:
+            caption += " - " + board.warning
+        if pygame.display.get_caption()[0] != caption:
+            pygame.display.set_caption(caption)
+
+        # Calculate the elapsed time
+        play_time = int(time.time() - start)
+        # Redraw the window, or only the parts that changed, and update just those on the display
+        if full_redraw:
+            redraw_window(win, board, play_time, strickers)
+            pygame.display.update()
+            full_redraw = False
+        else:
+            rects = redraw_dirty(win, board, play_time, strickers)
+            if rects:
+                pygame.display.update(rects)
+        clock.tick(fps)
+
+    board.stop_solve()
+    board.cancel_recording(wait=True)
+    puzzles.stop()
+
+# Run the main function when the file is started as a script
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play Sudoku.")
+    parser.add_argument("--size", type=int, default=9, choices=(9, 16, 25), help="board size (default: 9)")
+    parser.add_argument("--puzzles", metavar="FILE", help="play the 9x9 puzzles of a packed file (see packed.py)")
+    parser.add_argument("--index", type=int, help="index of the first puzzle to play from --puzzles (default: random)")
+    parser.add_argument("--replay", metavar="FILE", help="replay a solve trace recorded with traces.py")
+    args = parser.parse_args()
+    if args.puzzles and args.size != 9:
+        parser.error("--puzzles only holds 9x9 puzzles")
+    main(size=args.size, puzzle_file=args.puzzles, index=args.index, replay_file=args.replay)
+    # Quit Pygame when the main function returns
+    pygame.quit()
@@ -0,0 +1,189 @@
+# Solve traces.
+#
+# A trace records every change the engine's search makes to the board, the
+# same (ASSIGN, cell, value) and (BACKTRACK, cell, 0) events Engine.steps()
+# yields, so a search can be replayed and scrubbed through afterwards. The
+# file starts with a 28-byte header:
+#
+#   magic        4 bytes  b"SDKT"
+#   version      1 byte   1
+#   size         1 byte   board size (9, 16 or 25)
+#   event size   2 bytes  bytes per event, 2
+#   interval     4 bytes  events between two keyframes
+#   events       8 bytes  number of events
+#   keyframes    8 bytes  number of keyframes
+#
+# (all little-endian) followed by the events and then the keyframes. Every
+# event is one uint16, cell * 32 + value, a value of 0 being a backtrack.
+# Keyframe k is the whole board (one byte per cell) after the first
+# k * interval events, keyframe 0 being the puzzle itself. The board after any
+# step is rebuilt from the keyframe before it plus at most interval - 1
+# events, so seeking costs the same anywhere in the trace. Trace
+# memory-maps the file, so traces with tens of millions of events open
+# instantly and are never read as a whole.
+#
+# Usage:
+#   python traces.py record PUZZLE search.sdt
+#   python traces.py info search.sdt
+
+import argparse
+import mmap
+import struct
+import sys
+from array import array
+
+from core import parse_puzzle
+from solver import ASSIGN, BACKTRACK, Engine
+
+MAGIC = b"SDKT"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHIQQ")
+# Bytes per event
+EVENT = 2
+# Default number of events between two keyframes
+INTERVAL = 1024
+# Events written to the file at once while recording
+BUFFER = 65536
+
+
+# Function to record the search of a square board into a trace file. Stops
+# after `limit` events if given, or when the `stop` event (a threading.Event)
+# is set, which is checked at every keyframe. Returns
+# (number of events, True if the board was solved).
+def record(board, path, interval=INTERVAL, limit=None, stop=None):
+    engine = Engine(board)
+    size = engine.size
+    cells = bytearray(engine.cells)
+    keyframes = [bytes(cells)]
+    buffer = array("H")
+    count = 0
+    solved = False
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, size, EVENT, interval, 0, 0))
+        if engine.consistent:
+            steps = engine.steps()
+            try:
+                while limit is None or count < limit:
+                    kind, i, value = next(steps)
+                    buffer.append(i * 32 + value)
+                    cells[i] = value
+                    count += 1
+                    if count % interval == 0:
+                        keyframes.append(bytes(cells))
+                        if stop is not None and stop.is_set():
+                            break
+                    if len(buffer) >= BUFFER:
+                        write_events(f, buffer)
+                        buffer = array("H")
+            except StopIteration as done:
+                solved = bool(done.value)
+        write_events(f, buffer)
+        for keyframe in keyframes:
+            f.write(keyframe)
+        # The counts are only known at the end
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, size, EVENT, interval, count, len(keyframes)))
+    return count, solved
+
+
+# Function to write a buffer of events in little-endian order
+def write_events(f, buffer):
+    if sys.byteorder == "big":
+        buffer.byteswap()
+    f.write(buffer.tobytes())
+
+
+# A memory-mapped trace file
+class Trace:
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.map) < HEADER.size:
+            raise ValueError("{} is too short to be a trace file".format(path))
+        magic, version, size, event, interval, count, keyframes = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION or event != EVENT or not interval:
+            raise ValueError("{} is not a trace file".format(path))
+        self.size = size
+        self.cells = size * size
+        self.interval = interval
+        self.count = count
+        self.keyframes = keyframes
+        self.keyframe_start = HEADER.size + count * EVENT
+        if keyframes != count // interval + 1 or len(self.map) < self.keyframe_start + keyframes * self.cells:
+            raise ValueError("{} is truncated".format(path))
+        # Zero-copy view of the events as unsigned 16-bit integers
+        events = memoryview(self.map)[HEADER.size:self.keyframe_start]
+        if sys.byteorder == "big":
+            swapped = array("H", events.tobytes())
+            swapped.byteswap()
+            events.release()
+            self.events = swapped
+        else:
+            self.events = events.cast("H")
+
+    # Number of events
+    def __len__(self):
+        return self.count
+
+    # Returns event i as (ASSIGN, cell, value) or (BACKTRACK, cell, 0)
+    def event(self, i):
+        code = self.events[i]
+        value = code & 31
+        return (ASSIGN if value else BACKTRACK), code >> 5, value
+
+    # Returns the board after the first `step` events as a flat bytearray
+    # (step 0 is the puzzle, len(trace) the end of the search)
+    def board_at(self, step):
+        if not 0 <= step <= self.count:
+            raise IndexError("step out of range")
+        k = step // self.interval
+        start = self.keyframe_start + k * self.cells
+        cells = bytearray(self.map[start:start + self.cells])
+        events = self.events
+        for j in range(k * self.interval, step):
+            code = events[j]
+            cells[code >> 5] = code & 31
+        return cells
+
+    def close(self):
+        # The events view has to go before the map can be closed
+        if isinstance(self.events, memoryview):
+            self.events.release()
+        self.events = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and inspect solve traces.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_cmd = commands.add_parser("record", help="record the search of a puzzle")
+    record_cmd.add_argument("puzzle", help="puzzle line (81, 256 or 625 characters)")
+    record_cmd.add_argument("output", help="trace file to write")
+    record_cmd.add_argument("--interval", type=int, default=INTERVAL, help="events between two keyframes")
+    record_cmd.add_argument("--limit", type=int, help="stop recording after this many events")
+    info_cmd = commands.add_parser("info", help="show the size of a trace")
+    info_cmd.add_argument("input", help="trace file")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        board = parse_puzzle(args.puzzle)
+        if board is None:
+            parser.error("not a puzzle line")
+        count, solved = record(board, args.output, args.interval, args.limit)
+        sys.stderr.write("Recorded {} events, {}\n".format(count, "solved" if solved else "not solved"))
+    else:
+        with Trace(args.input) as trace:
+            print("{}: {}x{} board, {} events, {} keyframes every {} events".format(
+                args.input, trace.size, trace.size, len(trace), trace.keyframes, trace.interval))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
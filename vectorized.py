@@ -0,0 +1,179 @@
+# NumPy-vectorized batch candidate engine.
+#
+# Works on stacks of boards shaped (N, 9, 9) with dtype uint8 (0 for empty
+# cells). Candidate masks for every cell of every board are computed at once
+# with row/column/box OR-reductions, and naked and hidden singles are filled in
+# across the whole stack until nothing changes. Only the boards that still have
+# empty cells after that are handed to a scalar solver backend.
+#
+# Internally the stack is kept cell-major, shaped (9, 9, N) with one uint16
+# bitmask per cell (bit d - 1 for digit d, 0 for empty), so that every step of a
+# row, column or box scan works on a contiguous vector of N boards.
+#
+# verify_batch() checks whole stacks of solutions the same way: every row,
+# column and box must hold each digit once and every given must be kept, and
+# the failing units of each board are reported.
+
+import numpy as np
+
+from solvers import DEFAULT, get_solver
+
+# Bitmask with one bit per digit
+ALL = 0x1FF
+# Digit of a single-bit mask (0 for anything else)
+DIGIT_OF = np.zeros(ALL + 1, dtype=np.uint8)
+DIGIT_OF[[1 << d for d in range(9)]] = np.arange(1, 10, dtype=np.uint8)
+# Cell of every box as (row in band, column in stack)
+BOX_CELLS = [divmod(k, 3) for k in range(9)]
+
+
+# Function to turn (N, 9, 9) digit boards into (9, 9, N) bit boards
+def _to_bits(boards):
+    return np.left_shift(np.uint16(1), boards.transpose(1, 2, 0), dtype=np.uint16) >> 1
+
+
+# Function to fold 9 slices of masks together. Returns the bits set in at
+# least one slice and the bits set in two or more.
+def _fold(cells):
+    once = cells[0].copy()
+    twice = np.zeros_like(once)
+    for cell in cells[1:]:
+        twice |= once & cell
+        once |= cell
+    return once, twice
+
+
+# Function to scan every row, column and box of a (9, 9, N) stack of masks.
+# Each scan returns (once, twice) masks shaped (9, N).
+def _scan_units(grid):
+    n = grid.shape[2]
+    boxes = grid.reshape(3, 3, 3, 3, n)
+    return (_fold([grid[:, c] for c in range(9)]),
+            _fold([grid[r] for r in range(9)]),
+            tuple(m.reshape(9, n) for m in _fold([boxes[:, r, :, c] for r, c in BOX_CELLS])))
+
+
+# Function to combine per-row, per-column and per-box masks into one mask per cell
+def _cell_masks(rows, cols, boxes):
+    n = rows.shape[1]
+    cells = rows[:, None] | cols[None, :]
+    cells.reshape(3, 3, 3, 3, n)[...] |= boxes.reshape(3, 3, n)[:, None, :, None]
+    return cells
+
+
+# Function to compute candidate masks from bit boards together with the
+# row/column/box scans they were built from
+def _candidates(bits):
+    units = _scan_units(bits)
+    (rows, _), (cols, _), (boxes, _) = units
+    cand = (~_cell_masks(rows, cols, boxes) & ALL) * (bits == 0)
+    return cand, units
+
+
+# Function to compute the candidate masks of a stack of boards, shaped
+# (N, 9, 9). Filled cells get an empty mask.
+def candidate_masks(boards):
+    bits = _to_bits(np.asarray(boards, dtype=np.uint8).reshape(-1, 9, 9))
+    return _candidates(bits)[0].transpose(2, 0, 1)
+
+
+# Function to fill naked and hidden singles into a stack of boards, in place.
+# Returns a bool array marking the boards that turned out to be unsolvable: a
+# digit twice in a unit, an empty cell without candidates, or a missing digit
+# with no place left in a unit.
+def propagate(boards):
+    n = boards.shape[0]
+    state = _to_bits(boards)
+    broken = np.zeros(n, dtype=bool)
+    active = np.arange(n)
+    while active.size:
+        bits = state[:, :, active]
+        cand, units = _candidates(bits)
+        (rows, row_dup), (cols, col_dup), (boxes, box_dup) = units
+
+        # Hidden singles: digits with exactly one possible cell in a unit
+        (row_any, row_more), (col_any, col_more), (box_any, box_more) = _scan_units(cand)
+        hidden = cand & _cell_masks(row_any & ~row_more, col_any & ~col_more, box_any & ~box_more)
+
+        missing = ((row_any | rows) & (col_any | cols) & (box_any | boxes)) != ALL
+        bad = ((row_dup | col_dup | box_dup).any(axis=0) | missing.any(axis=0) |
+               ((bits | cand) == 0).reshape(81, -1).any(axis=0))
+        broken[active[bad]] = True
+
+        # Naked singles (one candidate left) win, otherwise take the lowest hidden digit
+        single = np.where(hidden, hidden & (~hidden + 1), cand)
+        single *= (single & (single - 1)) == 0
+        single[:, :, bad] = 0
+
+        changed = single.reshape(81, -1).any(axis=0)
+        state[:, :, active] = bits | single
+        active = active[changed]
+    boards[...] = DIGIT_OF[state].transpose(2, 0, 1)
+    return broken
+
+
+# Function to solve a stack of boards. Propagation runs on the whole stack and
+# only the boards that are still incomplete go to the scalar `solver` backend.
+# Returns the solved copy of the boards and a bool array marking the solved ones.
+def solve_batch(boards, solver=DEFAULT):
+    boards = np.array(boards, dtype=np.uint8).reshape(-1, 9, 9)
+    broken = propagate(boards)
+    solved = ~broken & (boards != 0).all(axis=(1, 2))
+
+    solve = get_solver(solver)
+    for i in np.flatnonzero(~broken & ~solved):
+        solved[i] = solve(boards[i])
+    return boards, solved
+
+
+# Function to OR together the masks of every row, column and box of a stack
+# of bit boards shaped (N, size, size). Returns three (N, size) arrays.
+def _unit_masks(bits, box):
+    n, size = bits.shape[0], bits.shape[1]
+    rows = bits[:, :, 0].copy()
+    cols = bits[:, 0].copy()
+    for k in range(1, size):
+        rows |= bits[:, :, k]
+        cols |= bits[:, k]
+    boxes = bits.reshape(n, box, box, box, box)
+    box_masks = boxes[:, :, 0, :, 0].copy()
+    for k in range(1, size):
+        box_masks |= boxes[:, :, k // box, :, k % box]
+    return rows, cols, box_masks.reshape(n, size)
+
+
+# Function to check a stack of solutions against the puzzles they should
+# solve, both shaped (N, size, size) (9, 16 or 25). A solution is valid when
+# every row, column and box holds each digit exactly once and every given of
+# its puzzle is kept. Returns:
+#   ok      - bool array (N,), True for the valid solutions
+#   units   - bool array (N, 3 * size), True for the rows, columns and boxes
+#             that are not a permutation of the digits (units in the same
+#             order as Layout.units: rows, then columns, then boxes)
+#   changed - bool array (N, size, size), True for the givens that were changed
+def verify_batch(solutions, puzzles):
+    solutions = np.asarray(solutions, dtype=np.uint8)
+    size = solutions.shape[-1]
+    box = int(round(size ** 0.5))
+    solutions = solutions.reshape(-1, size, size)
+    puzzles = np.asarray(puzzles, dtype=np.uint8).reshape(solutions.shape)
+
+    # One bit per digit, 0 for empty cells and out-of-range values. A unit of
+    # size cells holds every digit exactly once when its bits OR up to all ones.
+    dtype = np.uint16 if size <= 16 else np.uint32
+    bit = np.zeros(256, dtype=dtype)
+    bit[1:size + 1] = 1 << np.arange(size, dtype=dtype)
+    every = (1 << size) - 1
+    units = np.concatenate([masks != every for masks in _unit_masks(bit[solutions], box)], axis=1)
+    changed = (puzzles != 0) & (puzzles != solutions)
+    ok = ~units.any(axis=1) & ~changed.any(axis=(1, 2))
+    return ok, units, changed
+
+
+# Function to describe why a solution failed verify_batch, from its rows of
+# `units` and `changed`, e.g. ["row 3", "box 5", "given r2c4"]
+def describe_failure(units, changed):
+    size = changed.shape[-1]
+    names = ["{} {}".format(("row", "column", "box")[u // size], u % size + 1) for u in np.flatnonzero(units)]
+    names += ["given r{}c{}".format(r + 1, c + 1) for r, c in zip(*np.nonzero(changed))]
+    return names